@@ -1,17 +1,21 @@
 #!/usr/bin/python3
 
-from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtWidgets import QApplication
 from rpg import Base
-from rpg.gui.wizard import Wizard
 import logging
 import sys
 
 
 def main():
     base = Base()
-    app = QApplication(sys.argv)
     base.conf.parse_cmdline()
+    if base.conf.batch:
+        from rpg.batch import run_batch
+        sys.exit(run_batch(base.conf))
+
+    from PyQt5 import QtCore
+    from PyQt5.QtWidgets import QApplication
+    from rpg.gui.wizard import Wizard
+    app = QApplication(sys.argv)
     base.load_plugins()
     if base.conf.load_dnf:
         base.sack = base.dnf_load_sack()
@@ -24,7 +28,9 @@ def main():
     wiz.show()
 
     logging.info('GUI loaded')
-    sys.exit(app.exec_())
+    status = app.exec_()
+    base.save_profile()
+    sys.exit(status)
 
 if __name__ == '__main__':
     main()
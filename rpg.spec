@@ -10,7 +10,7 @@ BuildRequires:  python3-devel
 BuildRequires:  python3-nose
 BuildArch:      noarch
 
-Requires:       python3 >= 3.4
+Requires:       python3 >= 3.7
 Requires:       python3-qt5
 Requires:       qt5-qtbase-gui
 Requires:       coreutils
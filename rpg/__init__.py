@@ -1,17 +1,31 @@
 import logging
 import platform
 from pathlib import Path
-from rpg.plugin_engine import PluginEngine, phases
+from rpg.cache import AnalysisCache
+from rpg.checksum import StatCache, tree_checksum
+from rpg.plugin_engine import PluginEngine, phases, Cancelled
+from rpg.plugin_manifest import PluginManifest
+from rpg.sack_index import SackIndex, LazySack
+from rpg.predictor import Predictor
+from rpg.path_resolver import (PathResolver, replace_paths,
+                               include_dir_fallback)
 from rpg.project_builder import ProjectBuilder
 from rpg.copr_uploader import CoprUploader
-from rpg.package_builder import PackageBuilder
+from rpg.package_builder import PackageBuilder, BuildScheduler
 from rpg.source_loader import SourceLoader
-from rpg.spec import Spec
-from rpg.command import cmd_output
+from rpg.spec import Spec, SpecDelta
+from rpg.command import use_shell_pool
+from rpg.profiler import Profiler
 from rpg.conf import Conf
 from os.path import isdir
 from os import makedirs
 from os import geteuid
+from hashlib import sha1
+from collections import Counter
+from contextlib import contextmanager
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor, wait
+from copy import deepcopy
 import shutil
 
 
@@ -24,20 +38,58 @@ class Base(object):
         self._setup_logging()
         self._project_builder = ProjectBuilder()
         self.spec = Spec()
+        self._sack_index = None
+        self._predictors = None
+        self._path_resolver = PathResolver()
         self.sack = None
         self._package_builder = PackageBuilder()
         self._source_loader = SourceLoader()
         self._copr_uploader = CoprUploader()
+        self._analysis_cache = None
+        self._stat_cache = None
+        self._patches = []
+        self.profiler = None
+        self._cancel_event = Event()
+        self._build_executor = None
+        # (inputs, cancel event, build future, install future)
+        self._speculative_build = None
+
+    @property
+    def sack(self):
+        return self._sack
+
+    @sack.setter
+    def sack(self, sack):
+        self._sack = sack
+        self._predictors = None
+        self._path_resolver.sack = sack
+        if hasattr(self, "_plugin_engine"):
+            self._plugin_engine.sack = sack
 
     def dnf_load_sack(self):
+        """returns DNF sack, if its index from previous run is still valid,
+           sack is filled in background and the index is used meanwhile"""
         logging.info('DNF sack is loading')
         import dnf
-        with dnf.Base() as self._dnf_base:
-            self._dnf_base.conf.releasever = dnf.rpm.detect_releasever(
-                self._dnf_base.conf.installroot)
-            self._dnf_base.read_all_repos()
-            self._dnf_base.fill_sack()
-            return self._dnf_base.sack
+        self._dnf_base = dnf.Base()
+        self._dnf_base.conf.releasever = dnf.rpm.detect_releasever(
+            self._dnf_base.conf.installroot)
+        self._dnf_base.read_all_repos()
+        if self._sack_index and self._sack_index.open(
+                SackIndex.repos_checksum(self._dnf_base)):
+            logging.info('DNF sack index loaded')
+            return LazySack(self._dnf_fill_sack)
+        return self._dnf_fill_sack()
+
+    def _dnf_fill_sack(self):
+        self._dnf_base.fill_sack()
+        if self._sack_index:
+            # metadata could be refreshed during fill_sack
+            checksum = SackIndex.repos_checksum(self._dnf_base)
+            if checksum != self._sack_index.checksum:
+                self._sack_index.build(self._dnf_base.sack, checksum)
+        logging.info('DNF sack loaded')
+        return self._dnf_base.sack
 
     def _setup_logging(self):
         if geteuid() == 0:
@@ -54,14 +106,69 @@ class Base(object):
                             datefmt='%H:%M:%S')
 
     def load_plugins(self):
-        self._plugin_engine = PluginEngine(self.spec, self.sack)
+        if self.conf.shell_workers:
+            use_shell_pool(self.conf.shell_workers)
+        if self.conf.use_cache:
+            self._analysis_cache = AnalysisCache(Path(self.conf.cache_dir))
+            self._stat_cache = StatCache(
+                Path(self.conf.cache_dir) / "stat_cache")
+            self._package_builder.cache_dir = \
+                Path(self.conf.cache_dir) / "srpms"
+            self._sack_index = SackIndex(
+                Path(self.conf.cache_dir) / "sack.sqlite")
+            self._path_resolver = PathResolver(
+                self._sack_index, self.sack,
+                Path(self.conf.cache_dir) / "path_cache")
+        self._plugin_engine = PluginEngine(self.spec, self.sack,
+                                           self.conf.jobs)
+        self._plugin_engine.cache = self._analysis_cache
+        if self.conf.profile or self.conf.cprofile_dir:
+            self.profiler = Profiler(Path(self.conf.cprofile_dir)
+                                     if self.conf.cprofile_dir else None)
+        self._plugin_engine.profiler = self.profiler
+        self._plugin_engine.cancel_event = self._cancel_event
+        if self.conf.use_cache:
+            self._plugin_engine.manifest = PluginManifest(
+                Path(self.conf.cache_dir) / "plugin_manifest.json")
         self._plugin_engine.load_plugins(
-            Path('rpg/plugins'),
+            Path(__file__).parent / "plugins",
             self.conf.exclude)
         for directory in self.conf.directories:
             self._plugin_engine.load_plugins(
                 Path(directory),
                 self.conf.exclude)
+        self._plugin_engine.load_entry_points(self.conf.exclude)
+
+    def cancel(self):
+        """stops running analysis as soon as possible, method that is
+           executing raises rpg.plugin_engine.Cancelled"""
+        self._cancel_event.set()
+
+    def reset_cancel(self):
+        """has to be called before next background work after cancel"""
+        self._cancel_event.clear()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise Cancelled()
+
+    def snapshot_spec(self):
+        """returns copy of spec that can be restored by restore_spec"""
+        return SpecDelta.snapshot(self.spec)
+
+    def restore_spec(self, snapshot):
+        """discards changes of spec made after snapshot was taken"""
+        SpecDelta(self.spec, snapshot).apply(self.spec)
+
+    def new_project(self):
+        """starts analysis of another project with empty spec, loaded
+           plugins and sack are kept"""
+        self._discard_speculative_build()
+        self.spec = Spec()
+        self._plugin_engine.spec = self.spec
+        self._patches = []
+        if self.profiler:
+            self.profiler.records = []
 
     @property
     def base_dir(self):
@@ -99,49 +206,189 @@ class Base(object):
     def srpm_path(self):
         return next(self.base_dir.glob(self.project_name + "*src.rpm"))
 
+    @contextmanager
+    def _profile(self, step):
+        if self.profiler:
+            with self.profiler.step(step):
+                yield
+        else:
+            yield
+
+    def save_profile(self):
+        """saves report of profiler to file given by --profile"""
+        if self.profiler and self.conf.profile:
+            self.profiler.save(self.conf.profile)
+
     def process_archive_or_dir(self, path):
         """executed in background after dir/tarball/SRPM selection"""
+        with self._profile("process_archive_or_dir"):
+            self._process_archive_or_dir(path)
+
+    def _process_archive_or_dir(self, path):
         p = Path(path)
-        self._hash = self.compute_checksum(p)
+        self._discard_speculative_build()
+        self._source_digest = tree_checksum(p.resolve(), self._stat_cache)
+        self._hash = self._source_digest[:7]
         self._input_name = p.name
+        self._source_loader.import_mode = self.conf.import_mode
+        if self._analysis_cache and self._extracted_stamp.exists():
+            logging.info("sources already extracted in %s"
+                         % str(self.extracted_dir))
+            # outputs of previous run (builds, spec, SRPMs) must not leak
+            # into this one
+            self._clean_workspace()
+            return
         self._setup_workspace()
         self._source_loader.load_sources(p, self.extracted_dir)
+        if self._analysis_cache:
+            self._extracted_stamp.touch()
 
     def run_raw_sources_analysis(self):
         """executed in background after dir/tarball/SRPM selection"""
         self._plugin_engine.execute_phase(phases[0],
-                                          self.extracted_dir)
+                                          self.extracted_dir,
+                                          self._analysis_checksum())
 
     def apply_patches(self, ordered_patches):
         """executed in background after patch selection and reordering"""
+        self._patches = [tree_checksum(Path(str(patch)).resolve())
+                         for patch in ordered_patches]
         self._project_builder.apply_patches(ordered_patches)
 
     def run_patched_sources_analysis(self):
         """executed in background after patches are applied"""
         self._plugin_engine.execute_phase(phases[1],
-                                          self.extracted_dir)
+                                          self.extracted_dir,
+                                          self._analysis_checksum(
+                                              *self._patches))
+        self.resolve_requires()
+
+    def resolve_requires(self):
+        """replaces file paths in Requires and BuildRequires found by
+           plugins with names of packages owning them, unresolved system
+           headers are replaced by their directory"""
+        paths = [value for value in self.spec.Requires +
+                 self.spec.BuildRequires if str(value).startswith("/")]
+        if not paths:
+            return
+        owners = self._path_resolver.resolve(paths)
+        logging.info("%d of %d paths resolved to packages"
+                     % (len(owners), len(set(paths))))
+        self.spec.Requires = replace_paths(self.spec.Requires, owners,
+                                           include_dir_fallback)
+        self.spec.BuildRequires = replace_paths(self.spec.BuildRequires,
+                                                owners, include_dir_fallback)
+        self._path_resolver.save()
 
     def build_project(self):
         """executed in background after filled requires screen"""
-        self._project_builder.build(self.extracted_dir,
-                                    self.compiled_dir,
-                                    self.spec.build)
+        with self._profile("build_project"):
+            if self._claim_speculative_build():
+                self._speculative_result(2)
+                return
+            self._project_builder.build(self.extracted_dir,
+                                        self.compiled_dir,
+                                        self.spec.build,
+                                        self.conf.incremental_build,
+                                        self._cancel_event)
 
     def run_compiled_analysis(self):
         """executed in background after patches are applied"""
         self._plugin_engine.execute_phase(phases[2],
-                                          self.extracted_dir)
+                                          self.extracted_dir,
+                                          self._analysis_checksum(
+                                              *self._patches +
+                                              [str(self.spec.build)]))
 
     def install_project(self):
         """executed in background after filled requires screen"""
-        self._project_builder.install(self.compiled_dir,
-                                      self.installed_dir,
-                                      self.spec.install)
+        with self._profile("install_project"):
+            if self._claim_speculative_build():
+                self._speculative_result(3)
+                self._speculative_build = None
+                return
+            self._project_builder.install(self.compiled_dir,
+                                          self.installed_dir,
+                                          self.spec.install,
+                                          self._cancel_event)
+
+    def speculate_build(self):
+        """starts build and install of project in background with current
+           build and install scripts while user goes through the wizard.
+           build_project and install_project wait for its result if the
+           scripts are unchanged, otherwise it is cancelled and restarted.
+           Does nothing if speculative build is disabled in conf."""
+        if not self.conf.speculative_build:
+            return
+        inputs = self._build_inputs()
+        if self._speculative_build and self._speculative_build[0] == inputs:
+            return
+        self._discard_speculative_build()
+        if not str(self.spec.build).strip():
+            return
+        if not self._build_executor:
+            self._build_executor = ThreadPoolExecutor(1)
+        logging.info("speculative build started")
+        cancel_event = Event()
+        build = self._build_executor.submit(
+            self._project_builder.build, self.extracted_dir,
+            self.compiled_dir, deepcopy(self.spec.build),
+            self.conf.incremental_build, cancel_event)
+        install = self._build_executor.submit(
+            self._speculative_install, build, deepcopy(self.spec.install),
+            cancel_event)
+        self._speculative_build = (inputs, cancel_event, build, install)
+
+    def _speculative_install(self, build, install_command, cancel_event):
+        build.result()
+        self._project_builder.install(self.compiled_dir, self.installed_dir,
+                                      install_command, cancel_event)
+
+    def _build_inputs(self):
+        return (self._source_digest, tuple(self._patches),
+                str(self.spec.build), str(self.spec.install))
+
+    def _claim_speculative_build(self):
+        """returns True if speculative build was started with current
+           scripts, otherwise it is discarded"""
+        if self._speculative_build and \
+                self._speculative_build[0] == self._build_inputs():
+            return True
+        self._discard_speculative_build()
+        return False
+
+    def _speculative_result(self, index):
+        """waits for build or install future of speculative build, it's
+           discarded if waiting is cancelled"""
+        future = self._speculative_build[index]
+        try:
+            while not wait([future], 0.1).done:
+                self.check_cancelled()
+            return future.result()
+        except Exception:
+            self._discard_speculative_build()
+            raise
+
+    def _discard_speculative_build(self):
+        """cancels speculative build and removes what it installed"""
+        if not self._speculative_build:
+            return
+        _, cancel_event, build, install = self._speculative_build
+        self._speculative_build = None
+        cancel_event.set()
+        wait([build, install])
+        logging.info("speculative build discarded")
+        shutil.rmtree(str(self.installed_dir), ignore_errors=True)
+        self.installed_dir.mkdir(parents=True, exist_ok=True)
 
     def run_installed_analysis(self):
         """executed in background after successful project build"""
         self._plugin_engine.execute_phase(phases[3],
-                                          self.installed_dir)
+                                          self.installed_dir,
+                                          self._analysis_checksum(
+                                              *self._patches +
+                                              [str(self.spec.build),
+                                               str(self.spec.install)]))
 
     def write_spec(self):
         with open(str(self.spec_path), 'w') as spec_file:
@@ -154,20 +401,39 @@ class Base(object):
             self.spec_path, self.archive_path, self.base_dir)
 
     def build_packages(self, distros, archs=platform.machine()):
-        """builds packages for desired distributions"""
-        for arch in archs:
-            for distro in distros:
-                self._package_builder.build(self.spec_path, self.archive_path,
-                                            distro, arch)
+        """builds packages for desired distributions and architectures
+           concurrently, returns BuildReport"""
+        if isinstance(distros, str):
+            distros = [distros]
+        if isinstance(archs, str):
+            archs = [archs]
+        self.build_srpm()
+        scheduler = BuildScheduler(self._package_builder,
+                                   self.conf.build_workers,
+                                   self.conf.build_max_cpus,
+                                   self.conf.build_max_memory)
+        report = scheduler.run(self.srpm_path,
+                               [(distro, arch)
+                                for arch in archs for distro in distros],
+                               self.base_dir / "results")
+        logging.info("package builds finished:\n%s" % str(report))
+        return report
 
     @staticmethod
-    def compute_checksum(sources):
-        if sources.is_dir():
-            cmd = "find %s -type f -print0 | sort -z | xargs " \
-                  "-0 sha1sum | sha1sum" % sources.resolve()
-        else:
-            cmd = "sha1sum %s" % sources.resolve()
-        return cmd_output([cmd])[:7]
+    def compute_checksum(sources, stat_cache=None):
+        """short checksum of file or directory content, stat_cache
+           (rpg.checksum.StatCache) lets skip reading of unchanged files"""
+        return tree_checksum(sources.resolve(), stat_cache)[:7]
+
+    def _analysis_checksum(self, *inputs):
+        """checksum of sources and everything that changed them before
+           analysis (patches, build and install scripts)"""
+        return sha1("\0".join((self._source_digest,) + inputs)
+                    .encode("utf-8")).hexdigest()
+
+    @property
+    def _extracted_stamp(self):
+        return self.base_dir / ".extracted"
 
     @property
     def all_dirs(self):
@@ -185,6 +451,21 @@ class Base(object):
             pass
         for d in self.all_dirs:
             d.mkdir(parents=True)
+        for d in (self.compiled_dir, self.installed_dir):
+            self._project_builder.forget(d)
+
+    def _clean_workspace(self):
+        """removes everything from base_dir except extracted sources"""
+        for path in self.base_dir.iterdir():
+            if path in (self.extracted_dir, self._extracted_stamp):
+                continue
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(str(path))
+            else:
+                path.unlink()
+        for d in (self.compiled_dir, self.installed_dir):
+            d.mkdir(parents=True)
+            self._project_builder.forget(d)
 
     # predictor methods are used for autocompletion of the field,
     # every guess_* method return list of strings matched ordered
@@ -202,25 +483,51 @@ class Base(object):
                     return name.split(".tar")[0]
         return ""
 
-    def guess_provide(self):
+    def _sack_index_ready(self):
+        return self._sack_index is not None and \
+            self._sack_index.checksum is not None
+
+    def _predictor(self, kind):
+        """returns Predictor of provides, dependencies or licenses, all of
+           them are built at once from sack index or from sack"""
+        if self._predictors is None:
+            if self._sack_index_ready():
+                names = dict(self._sack_index.names(counts=True))
+                provides = dict(self._sack_index.provides(counts=True))
+                licenses = dict(self._sack_index.licenses(counts=True))
+            else:
+                names, provides, licenses = Counter(), Counter(), Counter()
+                for pkg in self.sack.query():
+                    names[pkg.name] += 1
+                    provides.update(set(str(p) for p in pkg.provides))
+                    if pkg.license:
+                        licenses[pkg.license] += 1
+            dependencies = Counter(provides)
+            dependencies.update(names)
+            self._predictors = {
+                "provide": Predictor(provides, provides),
+                "dependency": Predictor(dependencies, dependencies),
+                "license": Predictor(licenses, licenses)}
+        return self._predictors[kind]
+
+    def _complete(self, kind, prefix, limit):
+        predictor = self._predictor(kind)
+        if not prefix and limit is None:
+            return list(predictor.words)
+        return predictor.complete(prefix, limit)
+
+    def guess_provide(self, prefix="", limit=None):
         # returns list of all known provides
-        provides = set()
-        for pkg in self.sack.query():
-            provides.update(pkg.provides)
-        return sorted(provides)
+        return self._complete("provide", prefix, limit)
 
     def guess_changelog_data(self):
         # returns list of tuples (author, email) from git
         pass
 
-    def guess_dependency(self):
+    def guess_dependency(self, prefix="", limit=None):
         # returns guess_provide() + all package names from repos
-        names = map(lambda pkg: pkg.name, self.sack.query())
-        return sorted(set(names).union(set(self.guess_provide())))
+        return self._complete("dependency", prefix, limit)
 
-    def guess_license(self):
+    def guess_license(self, prefix="", limit=None):
         # returns list of all known licenses
-        licenses = set()
-        for pkg in self.sack.query():
-            licenses.update(pkg.license)
-        return sorted(licenses)
+        return self._complete("license", prefix, limit)
@@ -0,0 +1,230 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import json
+import logging
+import shutil
+import time
+import traceback
+
+# spec fields that can be set for each source in manifest
+METADATA = ("Name", "Version", "Release", "License", "URL", "Summary",
+            "description")
+
+# state of worker process, see _init_worker
+_worker = {}
+
+
+class BatchResult:
+
+    """result of spec generation for one source of manifest"""
+
+    def __init__(self, source, name=None, spec=None, srpm=None, error=None,
+                 duration=0.0, profile=None):
+        self.source = source
+        self.name = name
+        self.spec = spec
+        self.srpm = srpm
+        self.error = error
+        self.duration = duration
+        self.profile = profile
+
+    @property
+    def success(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {"source": self.source, "name": self.name, "spec": self.spec,
+                "srpm": self.srpm, "profile": self.profile,
+                "error": self.error,
+                "duration": self.duration,
+                "status": "ok" if self.success else "failed"}
+
+
+class BatchRunner:
+
+    """Generates spec files (and optionally SRPMs) for all sources listed
+       in manifest without GUI. Sources are processed by pool of worker
+       processes, every worker loads plugins and DNF sack only once.
+       Specs are saved as <Name>-<Version>.spec in output_dir, index of
+       source in manifest is appended if the name is already taken.
+
+       Manifest is JSON list, its items are paths of archives/directories
+       or objects with "source" key and optional spec fields (Name,
+       Version, Release, License, URL, Summary, description)."""
+
+    def __init__(self, conf, output_dir, workers=None, build_srpm=False):
+        self.conf = conf
+        self.output_dir = Path(str(output_dir))
+        self.workers = workers
+        self.build_srpm = build_srpm
+
+    @staticmethod
+    def load_manifest(path):
+        """returns list of dicts with "source" key"""
+
+        with open(str(path)) as manifest:
+            entries = json.load(manifest)
+        return [entry if isinstance(entry, dict) else {"source": entry}
+                for entry in entries]
+
+    def run(self, entries):
+        """processes entries returned by load_manifest, writes summary.json
+           to output_dir and returns list of BatchResults in manifest
+           order"""
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = self.output_dir / ".work"
+        results = [None] * len(entries)
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(_conf_values(self.conf),)) \
+                as executor:
+            futures = dict(
+                (executor.submit(_process_entry, entry,
+                                 str(work_dir / str(i)), self.build_srpm), i)
+                for i, entry in enumerate(entries))
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as err:
+                    # worker process crashed
+                    results[i] = BatchResult(entries[i]["source"],
+                                             error=str(err))
+                logging.info("[%d/%d] %s %s" % (
+                    done, len(entries), entries[i]["source"],
+                    "done" if results[i].success else "failed"))
+        self._collect(results, work_dir)
+        with open(str(self.output_dir / "summary.json"), "w") as summary:
+            json.dump([result.to_dict() for result in results], summary,
+                      indent=2)
+        return results
+
+    def _collect(self, results, work_dir):
+        """moves outputs of workers to output_dir in manifest order, so
+           names of colliding sources don't depend on completion order"""
+
+        taken = set()
+        for i, result in enumerate(results):
+            if not result.spec and not result.profile:
+                continue
+            stem = Path(result.spec).stem if result.spec else \
+                Path(result.source).name
+            if stem in taken:
+                logging.warn("outputs named %s already exist, outputs of %s "
+                             "are named %s-%d" % (stem, result.source, stem,
+                                                  i))
+                stem = "%s-%d" % (stem, i)
+            taken.add(stem)
+            if result.spec:
+                result.spec = self._move(result.spec, stem + ".spec")
+            if result.profile:
+                result.profile = self._move(result.profile,
+                                            stem + ".profile.json")
+            if result.srpm:
+                name = Path(result.srpm).name
+                if name in taken:
+                    name = "%d-%s" % (i, name)
+                taken.add(name)
+                result.srpm = self._move(result.srpm, name)
+        shutil.rmtree(str(work_dir), ignore_errors=True)
+
+    def _move(self, path, name):
+        return shutil.move(path, str(self.output_dir / name))
+
+    @staticmethod
+    def report(results):
+        """returns text summary of results"""
+
+        lines = []
+        for result in results:
+            lines.append("%-6s %7.1f s  %s" % (
+                "OK" if result.success else "FAILED", result.duration,
+                result.spec or result.source))
+            if result.error:
+                lines.append("    " + result.error.strip().splitlines()[-1])
+        failed = len([result for result in results if not result.success])
+        lines.append("%d sources, %d failed" % (len(results), failed))
+        return "\n".join(lines)
+
+
+def run_batch(conf):
+    """entry point of --batch, returns exit status"""
+
+    runner = BatchRunner(conf, conf.output_dir, conf.batch_workers or None,
+                         conf.batch_srpm)
+    results = runner.run(runner.load_manifest(conf.batch))
+    print(runner.report(results))
+    return 0 if all(result.success for result in results) else 1
+
+
+def _conf_values(conf):
+    """options of conf including those set on Conf class (plugin
+       directories), so workers get them with any start method"""
+
+    values = {}
+    for key in set(vars(type(conf))) | set(vars(conf)):
+        value = getattr(conf, key)
+        if key.startswith("_") or key == "parser" or callable(value):
+            continue
+        values[key] = list(value) if isinstance(value, list) else value
+    return values
+
+
+def _init_worker(conf_values):
+    from rpg import Base
+    from rpg.conf import Conf
+    base = Base()
+    base.conf = Conf()
+    base.conf.__dict__.update(conf_values)
+    base.load_plugins()
+    if base.conf.load_dnf:
+        base.sack = base.dnf_load_sack()
+    _worker["base"] = base
+
+
+def _process_entry(entry, work_dir, build_srpm):
+    """generates outputs of entry to work_dir, BatchRunner moves them to
+       output dir"""
+
+    source = entry["source"]
+    start = time.time()
+    result = BatchResult(source)
+    base = _worker["base"]
+    try:
+        base.new_project()
+        if base.profiler and base.conf.cprofile_dir:
+            base.profiler.cprofile_dir = Path(base.conf.cprofile_dir) / \
+                Path(work_dir).name
+        base.spec.Source = str(Path(source).resolve())
+        base.process_archive_or_dir(base.spec.Source)
+        base.spec.Name = entry.get("Name") or base.guess_name() or \
+            Path(source).name
+        for key in METADATA:
+            if entry.get(key):
+                setattr(base.spec, key, entry[key])
+        base.run_raw_sources_analysis()
+        base.apply_patches(list(base.spec.Patch))
+        base.run_patched_sources_analysis()
+        base.build_project()
+        base.run_compiled_analysis()
+        base.install_project()
+        base.run_installed_analysis()
+        base.write_spec()
+        result.name = base.spec.Name
+        Path(work_dir).mkdir(parents=True, exist_ok=True)
+        stem = "%s-%s" % (base.spec.Name, base.spec.Version) \
+            if base.spec.Version else base.spec.Name
+        result.spec = shutil.copy(str(base.spec_path),
+                                  str(Path(work_dir) / (stem + ".spec")))
+        if build_srpm:
+            base.build_srpm()
+            result.srpm = shutil.copy(str(base.srpm_path), work_dir)
+    except Exception:
+        result.error = traceback.format_exc()
+        logging.warn("processing of %s failed:\n%s" % (source, result.error))
+    if base.profiler and base.conf.profile:
+        Path(work_dir).mkdir(parents=True, exist_ok=True)
+        result.profile = str(Path(work_dir) / "profile.json")
+        base.profiler.save(result.profile)
+    result.duration = time.time() - start
+    return result
@@ -0,0 +1,49 @@
+from hashlib import sha1
+from rpg.utils import atomic_write
+import logging
+import pickle
+
+
+class AnalysisCache:
+
+    """Persistent storage of Spec changes made by plugins in each phase.
+       Entries are addressed by checksum of everything that affects the
+       result - project sources, phase, plugin versions and spec fields
+       read by plugins."""
+
+    def __init__(self, cache_dir):
+        """cache_dir is instance of pathlib.Path, it is created on first
+           store"""
+
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(*parts):
+        """returns cache key computed from string parts"""
+
+        return sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / "analysis" / key[:2] / key
+
+    def load(self, key):
+        """returns stored SpecDelta or None if there is no such entry"""
+
+        try:
+            with open(str(self._entry_path(key)), "rb") as entry:
+                return pickle.load(entry)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logging.warn("corrupted cache entry %s: %s" % (key, err))
+            return None
+
+    def store(self, key, delta):
+        """saves SpecDelta, entry is replaced atomically so concurrent
+           rpg processes can share the cache"""
+
+        try:
+            with atomic_write(self._entry_path(key)) as entry:
+                pickle.dump(delta, entry)
+        except OSError as err:
+            logging.warn("can't store cache entry %s: %s" % (key, err))
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from rpg.utils import atomic_write
+import logging
+import mmap
+import os
+import pickle
+
+BUFFER_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 16 * BUFFER_SIZE
+
+
+class StatCache:
+
+    """Remembers digests of files by their path, size and modification
+       time, so unchanged files don't have to be read again. Cache is
+       stored in file path (pathlib.Path) if given."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._digests = {}
+        self._changed = False
+        if path:
+            try:
+                with open(str(path), "rb") as cache_file:
+                    self._digests = pickle.load(cache_file)
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                logging.warn("corrupted stat cache %s: %s"
+                             % (str(path), err))
+
+    def get(self, path, stat):
+        return self._digests.get((path, stat.st_size, stat.st_mtime_ns))
+
+    def set(self, path, stat, digest):
+        self._digests[(path, stat.st_size, stat.st_mtime_ns)] = digest
+        self._changed = True
+
+    def prune(self, root, files):
+        """removes entries of paths under root except files - list of
+           (path, stat) found by the last walk of root"""
+
+        prefix = os.path.join(root, "")
+        seen = set((path, stat.st_size, stat.st_mtime_ns)
+                   for path, stat in files)
+        stale = [key for key in self._digests
+                 if key[0].startswith(prefix) and key not in seen]
+        for key in stale:
+            del self._digests[key]
+        if stale:
+            self._changed = True
+
+    def save(self):
+        if not self.path or not self._changed:
+            return
+        try:
+            with atomic_write(self.path) as f:
+                pickle.dump(self._digests, f)
+            self._changed = False
+        except OSError as err:
+            logging.warn("can't save stat cache %s: %s"
+                         % (str(self.path), err))
+
+
+def file_digest(path, size=None):
+    """returns sha1 hex digest of file content, big files are mapped
+       to memory, smaller ones are read by large blocks"""
+
+    digest = sha1()
+    with open(path, "rb", buffering=0) as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest.update(data)
+        else:
+            buf = bytearray(BUFFER_SIZE)
+            view = memoryview(buf)
+            while True:
+                read = f.readinto(buf)
+                if not read:
+                    break
+                digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def tree_checksum(path, stat_cache=None, jobs=None):
+    """returns sha1 hex digest of file or directory (pathlib.Path) - its
+       relative file paths and their contents. Files are hashed in jobs
+       threads, unchanged files known to stat_cache are not read."""
+
+    path = str(path)
+    if not os.path.isdir(path):
+        return _cached_digest(path, os.stat(path), stat_cache)
+    files = sorted(_walk_files(path))
+    with ThreadPoolExecutor(jobs) as executor:
+        digests = executor.map(
+            lambda f: _cached_digest(f[1], f[2], stat_cache), files)
+        checksum = sha1()
+        for (relative, _, _), digest in zip(files, digests):
+            checksum.update(("%s  %s\n" % (digest, relative))
+                            .encode("utf-8", "surrogateescape"))
+    if stat_cache:
+        stat_cache.prune(path, [(f, stat) for _, f, stat in files])
+        stat_cache.save()
+    return checksum.hexdigest()
+
+
+def _cached_digest(path, stat, stat_cache):
+    if stat_cache:
+        digest = stat_cache.get(path, stat)
+        if digest:
+            return digest
+    digest = file_digest(path, stat.st_size)
+    if stat_cache:
+        stat_cache.set(path, stat, digest)
+    return digest
+
+
+def _walk_files(root, relative=""):
+    """yields (relative path, path, stat) of regular files in root"""
+
+    with os.scandir(root) as entries:
+        for entry in entries:
+            rel = os.path.join(relative, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path, rel)
+            elif entry.is_file(follow_symlinks=False):
+                yield (rel, entry.path, entry.stat(follow_symlinks=False))
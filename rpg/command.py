@@ -1,4 +1,22 @@
-from subprocess import check_output
+from subprocess import CalledProcessError, Popen, PIPE, DEVNULL
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import mkdtemp
+from threading import Lock
+from queue import LifoQueue, Empty
+import logging
+import os
+import shlex
+import shutil
+import signal
+import threading
+import time
+import uuid
+
+# pool of shell workers used by cmd_output, see use_shell_pool
+_shell_pool = None
+
+# seconds cancelled command has to exit after SIGTERM before it's killed
+KILL_TIMEOUT = 5
 
 
 class Command:
@@ -49,16 +67,273 @@ class Command:
         """executes command in work_dir (instance of pathlib.Path),
            can raise CalledProcessError"""
 
+        return cmd_output(self._command_lines_from(work_dir))
+
+    def run_from(self, work_dir, output_file=None, cancel_event=None):
+        """executes command in work_dir and returns CommandResult instead
+           of raising exception, stdout is written to output_file (path)
+           if given, see cmd_run"""
+
+        return cmd_run(self._command_lines_from(work_dir), output_file,
+                       cancel_event)
+
+    def _command_lines_from(self, work_dir):
         cd_workdir = ["cd %s" % str(work_dir.resolve()).replace(" ", "\\ ")]
-        command_lines = self._assign_rpm_variables() + cd_workdir + \
+        return self._assign_rpm_variables() + cd_workdir + \
             self._command_lines
-        return cmd_output(command_lines)
 
     def _assign_rpm_variables(self):
         return ['%s="%s"' % (v, p) for (v, p) in self.rpm_variables]
 
 
 def cmd_output(cmdlines, binary=False):
-    output = check_output(["/bin/sh", "-c", " 2>/dev/null && ".join(cmdlines) +
-                           " 2>/dev/null" ])
-    return output if binary else output.decode('utf-8')
+    """returns stdout of command lines joined by &&, raises
+       CalledProcessError (with captured stderr) if they fail"""
+
+    result = cmd_run(cmdlines)
+    result.check()
+    return result.stdout if binary else result.stdout.decode('utf-8')
+
+
+def cmd_run(cmdlines, output_file=None, cancel_event=None):
+    """executes command lines joined by && and returns CommandResult,
+       stdout is streamed to output_file (path) instead of memory if given.
+       Command and all processes it started are killed when cancel_event
+       (threading.Event) is set, result has cancelled attribute set then."""
+
+    if _shell_pool and not output_file and not cancel_event:
+        return _shell_pool.run(cmdlines)
+    cmd = ["/bin/sh", "-c", " && ".join(cmdlines)]
+    start = time.monotonic()
+    stdout = open(str(output_file), "wb") if output_file else PIPE
+    try:
+        # own process group, so the whole command can be killed
+        process = Popen(cmd, stdin=DEVNULL, stdout=stdout, stderr=PIPE,
+                        start_new_session=cancel_event is not None)
+    finally:
+        if output_file:
+            stdout.close()
+    finished = threading.Event()
+    if cancel_event is not None:
+        threading.Thread(target=_kill_on_cancel,
+                         args=(process.pid, cancel_event, finished),
+                         daemon=True).start()
+    outputs = {}
+
+    def read(name, stream):
+        outputs[name] = stream.read()
+        stream.close()
+    readers = [threading.Thread(target=read, args=("stderr", process.stderr))]
+    if not output_file:
+        readers.append(threading.Thread(target=read,
+                                        args=("stdout", process.stdout)))
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    # wait4 reports resources used by the shell and everything it waited for
+    _, status, usage = os.wait4(process.pid, 0)
+    finished.set()
+    process.returncode = _exit_code(status)
+    result = CommandResult(cmdlines, process.returncode,
+                           outputs.get("stdout"), outputs["stderr"],
+                           time.monotonic() - start)
+    result.cpu_time = usage.ru_utime + usage.ru_stime
+    result.max_rss = usage.ru_maxrss
+    result.output_file = output_file
+    result.cancelled = cancel_event is not None and cancel_event.is_set()
+    return result
+
+
+def _exit_code(status):
+    """exit code of wait status, negative signal number if process was
+       killed (like Popen.returncode)"""
+
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _kill_on_cancel(pid, cancel_event, finished):
+    while not finished.is_set():
+        if cancel_event.wait(0.1):
+            # processes that ignore SIGTERM are killed after KILL_TIMEOUT
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                if finished.is_set():
+                    return
+                logging.info("killing cancelled command %d (signal %d)"
+                             % (pid, sig))
+                try:
+                    os.killpg(pid, sig)
+                except ProcessLookupError:
+                    return
+                finished.wait(KILL_TIMEOUT)
+            return
+
+
+def use_shell_pool(size):
+    """cmd_output runs commands in pool of size persistent shells instead
+       of starting new shell for each of them, size 0 stops the pool"""
+
+    global _shell_pool
+    if _shell_pool:
+        _shell_pool.close()
+    _shell_pool = ShellPool(size) if size else None
+
+
+class CommandResult:
+
+    """result of command lines executed by shell - stdout (None if it was
+       written to output_file) and stderr bytes, exit code, wall and CPU
+       time in seconds and peak resident memory in KiB (CPU time and memory
+       are None for commands executed by ShellPool)"""
+
+    def __init__(self, cmdlines, returncode, stdout, stderr, wall_time):
+        self.cmdlines = cmdlines
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall_time = wall_time
+        self.cpu_time = None
+        self.max_rss = None
+        self.output_file = None
+        self.cancelled = False
+
+    def __str__(self):
+        return "exit code %d, %.2f s wall, %s s CPU, %s KiB max RSS: %s" % (
+            self.returncode, self.wall_time,
+            "%.2f" % self.cpu_time if self.cpu_time is not None else "?",
+            self.max_rss if self.max_rss is not None else "?",
+            " && ".join(self.cmdlines))
+
+    def check(self):
+        """raises CalledProcessError if command failed"""
+
+        if self.returncode:
+            raise CalledProcessError(
+                self.returncode, ["/bin/sh", "-c", " && ".join(self.cmdlines)],
+                self.stdout, self.stderr)
+
+
+class ShellWorker:
+
+    """Long running /bin/sh that executes commands written to its stdin,
+       so they don't pay for start of new shell. Every command runs in
+       subshell (changes of directory or variables don't leak to next
+       command), its output is captured to files and exit code is reported
+       back to worker with unique marker line."""
+
+    def __init__(self):
+        self._tmp_dir = mkdtemp(prefix="rpg-shell-")
+        self._marker = "rpg-" + uuid.uuid4().hex
+        self._lock = Lock()
+        self._process = None
+
+    def _start(self):
+        self._process = Popen(["/bin/sh"], stdin=PIPE, stdout=PIPE,
+                              universal_newlines=True)
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def run(self, cmdlines):
+        """executes list of command lines joined by && and returns
+           CommandResult"""
+
+        out_path = os.path.join(self._tmp_dir, "stdout")
+        err_path = os.path.join(self._tmp_dir, "stderr")
+        # command is passed as single quoted word, so comments or syntax
+        # errors in it can't swallow the marker
+        script = "( eval %s ) </dev/null >%s 2>%s; echo %s $?\n" % (
+            shlex.quote(" && ".join(cmdlines)), shlex.quote(out_path),
+            shlex.quote(err_path), self._marker)
+        with self._lock:
+            if not self.alive:
+                self._start()
+            for path in (out_path, err_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+            start = time.monotonic()
+            self._process.stdin.write(script)
+            self._process.stdin.flush()
+            returncode = None
+            for line in self._process.stdout:
+                if line.startswith(self._marker + " "):
+                    returncode = int(line.split()[1])
+                    break
+            wall_time = time.monotonic() - start
+            if returncode is None:
+                # shell itself was terminated (e.g. by exec in command)
+                returncode = self._process.wait() or 1
+                self._process = None
+            return CommandResult(cmdlines, returncode, _read(out_path),
+                                 _read(err_path), wall_time)
+
+    def close(self):
+        with self._lock:
+            if self.alive:
+                self._process.stdin.close()
+                self._process.wait()
+            self._process = None
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class ShellPool:
+
+    """Pool of at most size ShellWorkers, workers are started lazily and
+       reused by subsequent commands"""
+
+    def __init__(self, size=None):
+        self.size = size or os.cpu_count() or 1
+        self._idle = LifoQueue()
+        self._workers = []
+        self._lock = Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if len(self._workers) < self.size:
+                worker = ShellWorker()
+                self._workers.append(worker)
+                return worker
+        return self._idle.get()
+
+    def run(self, cmdlines):
+        """executes list of command lines, returns CommandResult"""
+
+        worker = self._acquire()
+        try:
+            return worker.run(cmdlines)
+        finally:
+            self._idle.put(worker)
+
+    def run_batch(self, commands):
+        """executes list of commands (lists of command lines) in parallel,
+           returns list of CommandResults in the same order"""
+
+        with ThreadPoolExecutor(self.size) as executor:
+            results = list(executor.map(self.run, commands))
+        for result in results:
+            logging.debug("%.3f s, exit code %d: %s" % (
+                result.wall_time, result.returncode,
+                " && ".join(result.cmdlines)))
+        return results
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+            self._idle = LifoQueue()
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
@@ -8,6 +8,22 @@ class Conf:
     directories = []
     exclude = []
     load_dnf = True
+    jobs = 1
+    use_cache = True
+    import_mode = "auto"
+    incremental_build = True
+    speculative_build = True
+    build_workers = 0
+    build_max_cpus = 0
+    build_max_memory = 0
+    shell_workers = 0
+    profile = None
+    batch = None
+    output_dir = "."
+    batch_workers = 0
+    batch_srpm = False
+    cprofile_dir = None
+    cache_dir = path.expanduser("~/.cache/rpg")
 
     def parse_cmdline(self):
 
@@ -25,8 +41,86 @@ class Conf:
         self.parser.add_argument(
             '--disable-dnf', dest='load_dnf', action='store_false',
             default=True, help='Disable loading DNF sack')
+        self.parser.add_argument(
+            '--jobs', '-j', type=int, dest='jobs', default=1,
+            help='Number of plugins executed in parallel', metavar='<n>')
+        self.parser.add_argument(
+            '--disable-cache', dest='use_cache', action='store_false',
+            default=True, help='Disable cache of analysis results')
+        self.parser.add_argument(
+            '--cache-dir', type=str, dest='cache_dir',
+            default=self.cache_dir, help='Directory of analysis cache',
+            metavar='<dir>')
+        self.parser.add_argument(
+            '--import-mode', dest='import_mode', default='auto',
+            choices=['auto', 'copy'],
+            help='How source directory is imported - copy-on-write '
+                 'reflinks with copy fallback (auto) or full copy')
+        self.parser.add_argument(
+            '--disable-incremental-build', dest='incremental_build',
+            action='store_false', default=True,
+            help='Copy and build whole project again on every build')
+        self.parser.add_argument(
+            '--disable-speculative-build', dest='speculative_build',
+            action='store_false', default=True,
+            help='Wait with build until user confirms build script')
+        self.parser.add_argument(
+            '--build-workers', type=int, dest='build_workers', default=0,
+            help='Number of concurrent mock builds (default: number of CPUs)',
+            metavar='<n>')
+        self.parser.add_argument(
+            '--build-max-cpus', type=int, dest='build_max_cpus', default=0,
+            help='CPUs shared by all concurrent mock builds (default: all)',
+            metavar='<n>')
+        self.parser.add_argument(
+            '--build-max-memory', type=int, dest='build_max_memory',
+            default=0, metavar='<MiB>',
+            help='Memory for all concurrent mock builds (default: available)')
+        self.parser.add_argument(
+            '--shell-workers', type=int, dest='shell_workers', default=0,
+            help='Run commands in <n> persistent shells instead of '
+                 'starting new shell for each one', metavar='<n>')
+        self.parser.add_argument(
+            '--profile', type=str, dest='profile', default=None,
+            help='Save timings of plugins and build steps to JSON file',
+            metavar='<file>')
+        self.parser.add_argument(
+            '--cprofile-dir', type=str, dest='cprofile_dir', default=None,
+            help='Run plugins under cProfile and save stats to <dir>',
+            metavar='<dir>')
+        self.parser.add_argument(
+            '--batch', type=str, dest='batch', default=None,
+            help='Generate specs for all sources in JSON manifest '
+                 'without GUI', metavar='<manifest>')
+        self.parser.add_argument(
+            '--output-dir', type=str, dest='output_dir', default='.',
+            help='Directory of specs and SRPMs generated in batch mode',
+            metavar='<dir>')
+        self.parser.add_argument(
+            '--batch-workers', type=int, dest='batch_workers', default=0,
+            help='Number of sources processed concurrently in batch mode '
+                 '(default: number of CPUs)', metavar='<n>')
+        self.parser.add_argument(
+            '--batch-srpm', dest='batch_srpm', action='store_true',
+            default=False, help='Build SRPM of every source in batch mode')
         args = self.parser.parse_args()
         self.load_dnf = args.load_dnf
+        self.jobs = max(args.jobs, 1)
+        self.use_cache = args.use_cache
+        self.cache_dir = args.cache_dir
+        self.import_mode = args.import_mode
+        self.incremental_build = args.incremental_build
+        self.speculative_build = args.speculative_build
+        self.build_workers = args.build_workers
+        self.build_max_cpus = args.build_max_cpus
+        self.build_max_memory = args.build_max_memory
+        self.shell_workers = args.shell_workers
+        self.profile = args.profile
+        self.cprofile_dir = args.cprofile_dir
+        self.batch = args.batch
+        self.output_dir = args.output_dir
+        self.batch_workers = args.batch_workers
+        self.batch_srpm = args.batch_srpm
         if args.plug_dir:
             for arg in args.plug_dir:
                 if path.isdir(arg):
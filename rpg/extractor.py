@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from shutil import copyfileobj
+from threading import Lock, local
+import logging
+import os
+import stat
+import tarfile
+import time
+import zipfile
+
+BUFFER_SIZE = 1024 * 1024
+
+# compressions tarfile module can decompress
+_tar_modes = {"gz": "gz", "bz2": "bz2", "xz": "xz", "lzma": "xz", None: ""}
+
+
+class Extractor:
+
+    """Extracts tar and zip archives in process. Members are streamed
+       directly to disk, zip members are decompressed in parallel threads.
+       progress is optional callable taking number of processed bytes,
+       total number of bytes and throughput (bytes per second)."""
+
+    def __init__(self, progress=None, jobs=None):
+        self.progress = progress
+        self.jobs = jobs
+        self._lock = Lock()
+
+    @staticmethod
+    def supports(compr):
+        """compr is tuple returned by SourceLoader.get_compression_method"""
+
+        if compr[0] == "tar":
+            return compr[1] in _tar_modes
+        return compr[0] in ("tgz", "tbz2", "zip")
+
+    def extract(self, archive, target_dir, compr):
+        """extracts archive (path) to existing target_dir,
+           returns number of extracted bytes"""
+
+        compr = _compression(compr)
+        self._start = time.time()
+        self._done = 0
+        if compr == "zip":
+            extracted = self._extract_zip(archive, target_dir)
+        else:
+            self._total = os.path.getsize(archive)
+            extracted = self._extract_tar(archive, target_dir, compr)
+        elapsed = max(time.time() - self._start, 1e-6)
+        logging.info("extracted %s: %.1f MiB in %.2f s (%.1f MiB/s)"
+                     % (archive, extracted / 2 ** 20, elapsed,
+                        extracted / 2 ** 20 / elapsed))
+        return extracted
+
+    def _report(self, size):
+        with self._lock:
+            self._done += size
+            done = self._done
+        if self.progress:
+            elapsed = max(time.time() - self._start, 1e-6)
+            self.progress(done, self._total, done / elapsed)
+
+    def _extract_tar(self, archive, target_dir, compr):
+        extracted = 0
+        directories = []
+        with open(archive, "rb") as raw:
+            reader = _ProgressReader(raw, self._report)
+            with tarfile.open(fileobj=reader, mode="r|" + compr,
+                              bufsize=BUFFER_SIZE) as tar:
+                for member in tar:
+                    dest = _destination(target_dir, member.name)
+                    if dest is None:
+                        logging.warn("skipping unsafe member %s of %s"
+                                     % (member.name, archive))
+                    elif member.isdir():
+                        os.makedirs(dest, exist_ok=True)
+                        directories.append((dest, member))
+                    elif member.isfile():
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        _remove(dest)
+                        with open(dest, "wb") as out:
+                            copyfileobj(tar.extractfile(member), out,
+                                        BUFFER_SIZE)
+                        _set_attrs(dest, member.mode, member.mtime)
+                        extracted += member.size
+                    elif member.issym() or member.islnk():
+                        _link(target_dir, dest, member)
+                    else:
+                        logging.warn("skipping special file %s of %s"
+                                     % (member.name, archive))
+        # directory times have to be set after their content is written
+        for dest, member in reversed(directories):
+            _set_attrs(dest, member.mode, member.mtime)
+        return extracted
+
+    def _extract_zip(self, archive, target_dir):
+        # later member of the same name replaces earlier one
+        members = {}
+        with zipfile.ZipFile(archive) as zip_file:
+            infos = zip_file.infolist()
+        self._total = sum(info.file_size for info in infos)
+        for info in infos:
+            dest = _destination(target_dir, info.filename)
+            if dest is None:
+                logging.warn("skipping unsafe member %s of %s"
+                             % (info.filename, archive))
+            elif info.is_dir():
+                os.makedirs(dest, exist_ok=True)
+            else:
+                members[dest] = info
+        # each thread reads the archive through its own file handle
+        handles = local()
+        opened = []
+
+        def extract_member(member):
+            dest, info = member
+            if not hasattr(handles, "zip"):
+                handles.zip = zipfile.ZipFile(archive)
+                opened.append(handles.zip)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            _remove(dest)
+            mode = info.external_attr >> 16
+            with handles.zip.open(info) as src:
+                if stat.S_ISLNK(mode):
+                    link = src.read().decode("utf-8")
+                    if _destination(target_dir, os.path.join(
+                            os.path.dirname(dest), link)) is None:
+                        logging.warn("skipping symlink %s pointing outside "
+                                     "of archive" % info.filename)
+                    else:
+                        os.symlink(link, dest)
+                    return 0
+                with open(dest, "wb") as out:
+                    while True:
+                        data = src.read(BUFFER_SIZE)
+                        if not data:
+                            break
+                        out.write(data)
+                        self._report(len(data))
+            _set_attrs(dest, mode or 0o644,
+                       time.mktime(info.date_time + (0, 0, -1)))
+            return info.file_size
+
+        try:
+            with ThreadPoolExecutor(self.jobs) as executor:
+                return sum(executor.map(extract_member, members.items()))
+        finally:
+            for handle in opened:
+                handle.close()
+
+
+class _ProgressReader:
+
+    """file object wrapper reporting number of read bytes"""
+
+    def __init__(self, raw, report):
+        self._raw = raw
+        self._report = report
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self._report(len(data))
+        return data
+
+
+def _compression(compr):
+    if compr[0] == "tgz":
+        return "gz"
+    if compr[0] == "tbz2":
+        return "bz2"
+    if compr[0] == "zip":
+        return "zip"
+    return _tar_modes[compr[1]]
+
+
+def _destination(target_dir, name):
+    """returns path of member in target_dir or None if it would be
+       written outside of it. Symlinks are resolved in parent directories
+       only, so path of member replacing a symlink is the symlink itself."""
+
+    target_dir = os.path.realpath(target_dir)
+    parent, base = os.path.split(os.path.normpath(
+        os.path.join(target_dir, name)))
+    dest = os.path.join(os.path.realpath(parent), base)
+    if os.path.commonpath([target_dir, dest]) != target_dir:
+        return None
+    return dest
+
+
+def _remove(path):
+    """removes file or symlink replaced by member of the same name, like
+       GNU tar does, so it isn't written through a symlink"""
+
+    if os.path.islink(path) or os.path.isfile(path):
+        os.unlink(path)
+
+
+def _link(target_dir, dest, member):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if member.issym():
+        link_target = os.path.join(os.path.dirname(dest), member.linkname)
+        if _destination(target_dir, link_target) is None:
+            logging.warn("skipping symlink %s pointing outside of archive"
+                         % member.name)
+            return
+        _remove(dest)
+        os.symlink(member.linkname, dest)
+    else:
+        source = _destination(target_dir, member.linkname)
+        if source is None:
+            logging.warn("skipping hardlink %s pointing outside of archive"
+                         % member.name)
+            return
+        if source != dest:
+            _remove(dest)
+            os.link(source, dest)
+
+
+def _set_attrs(path, mode, mtime):
+    os.chmod(path, stat.S_IMODE(mode) & 0o777)
+    os.utime(path, (mtime, mtime))
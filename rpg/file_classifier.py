@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import logging
+import os
+
+try:
+    import magic
+except ImportError:
+    magic = None
+
+# number of bytes read from the beginning of a file to classify it
+HEAD_SIZE = 64 * 1024
+
+UNIFIED_DIFF = "unified diff output"
+
+
+class FileClassifier:
+
+    """Describes types of files like file(1) does, without running it for
+       every file. Unified diffs are recognized by built-in sniffer, other
+       files by libmagic bindings if they are installed. Descriptions are
+       remembered by inode and modification time."""
+
+    _cache = {}
+    _lock = Lock()
+    _magic_lock = Lock()
+
+    def __init__(self, jobs=None):
+        self.jobs = jobs
+        self._magic = _open_magic()
+
+    def describe(self, paths):
+        """returns dict path -> description for all files in paths,
+           directories and unreadable files are described as "directory"
+           and "unreadable" """
+
+        paths = list(paths)
+        with ThreadPoolExecutor(self.jobs) as executor:
+            return dict(zip(paths, executor.map(self._describe, paths)))
+
+    def is_patch(self, paths):
+        """returns list of paths that are unified diffs"""
+
+        return [path for path, description in self.describe(paths).items()
+                if UNIFIED_DIFF in description]
+
+    def _describe(self, path):
+        try:
+            stat = os.stat(str(path))
+        except OSError:
+            return "unreadable"
+        if os.path.isdir(str(path)):
+            return "directory"
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            description = self._cache.get(key)
+        if description is None:
+            try:
+                with open(str(path), "rb") as f:
+                    head = f.read(HEAD_SIZE)
+            except OSError:
+                return "unreadable"
+            description = self._classify(head)
+            with self._lock:
+                self._cache[key] = description
+        return description
+
+    def _classify(self, head):
+        if _is_unified_diff(head):
+            return UNIFIED_DIFF
+        if self._magic:
+            try:
+                with self._magic_lock:
+                    return self._magic(head)
+            except Exception as err:
+                logging.warn("libmagic failed: %s" % err)
+        return "data"
+
+
+def _open_magic():
+    """returns function describing buffer by libmagic or None"""
+
+    if magic is None:
+        return None
+    if hasattr(magic, "from_buffer"):
+        # python-magic
+        return magic.from_buffer
+    if hasattr(magic, "open"):
+        # bindings distributed with file(1)
+        cookie = magic.open(magic.MAGIC_NONE)
+        cookie.load()
+        return cookie.buffer
+    return None
+
+
+def _is_unified_diff(head):
+    """True if data contain ---, +++ and @@ lines of unified diff hunk"""
+
+    lines = head.decode("latin-1").splitlines()
+    for i in range(len(lines) - 2):
+        if lines[i].startswith("--- ") and \
+                lines[i + 1].startswith("+++ ") and \
+                lines[i + 2].startswith("@@ "):
+            return True
+    return False
@@ -0,0 +1,122 @@
+from fnmatch import fnmatchcase
+from pathlib import Path
+from threading import Lock
+import os
+import stat
+
+
+class FileEntry:
+
+    """file found by FileIndex, relpath is relative to index root
+       (with / separators), stat is result of lstat"""
+
+    __slots__ = ("path", "relpath", "stat", "type")
+
+    def __init__(self, path, relpath, stat_result, file_type):
+        self.path = path
+        self.relpath = relpath
+        self.stat = stat_result
+        self.type = file_type
+
+    @property
+    def name(self):
+        return self.relpath.rsplit("/", 1)[-1]
+
+    def is_file(self):
+        """True for regular files and symlinks pointing to them"""
+        if self.type == "symlink":
+            return os.path.isfile(str(self.path))
+        return self.type == "file"
+
+    def is_dir(self):
+        return self.type == "dir"
+
+    def __repr__(self):
+        return "FileEntry(%r, %s)" % (self.relpath, self.type)
+
+
+class FileIndex:
+
+    """List of all files and directories under root (pathlib.Path) read
+       by single os.scandir walk. Indexes are shared - PluginEngine builds
+       index of project dir before every phase and plugins get it with
+       FileIndex.of instead of walking the tree again."""
+
+    _indexes = {}
+    _lock = Lock()
+
+    def __init__(self, root):
+        self.root = Path(os.path.realpath(str(root)))
+        self.entries = []
+        self._walk(str(self.root), "")
+
+    @classmethod
+    def of(cls, root, refresh=False):
+        """returns shared index of root, it is built if there is none yet
+           or refresh is True"""
+
+        key = os.path.realpath(str(root))
+        with cls._lock:
+            index = cls._indexes.get(key)
+            if index is None or refresh:
+                index = cls._indexes[key] = cls(key)
+            return index
+
+    @classmethod
+    def drop(cls, root):
+        """forgets shared index of root, FileIndex.of walks it again"""
+
+        with cls._lock:
+            cls._indexes.pop(os.path.realpath(str(root)), None)
+
+    def _walk(self, path, prefix):
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            relpath = prefix + entry.name
+            try:
+                entry_stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISLNK(entry_stat.st_mode):
+                file_type = "symlink"
+            elif stat.S_ISDIR(entry_stat.st_mode):
+                file_type = "dir"
+            elif stat.S_ISREG(entry_stat.st_mode):
+                file_type = "file"
+            else:
+                file_type = "other"
+            self.entries.append(FileEntry(self.root / relpath, relpath,
+                                          entry_stat, file_type))
+            if file_type == "dir":
+                self._walk(entry.path, relpath + "/")
+
+    def files(self):
+        """returns entries that are files or symlinks to files"""
+
+        return [entry for entry in self.entries if entry.is_file()]
+
+    def glob(self, pattern):
+        """returns entries matching pattern relative to root in order of
+           walk, wildcards match within one path component and "**"
+           matches any number of directories like in pathlib.Path.glob"""
+
+        parts = pattern.split("/")
+        if len(parts) == 2 and parts[0] == "**":
+            # the most common case doesn't need path splitting
+            return [entry for entry in self.entries
+                    if fnmatchcase(entry.name, parts[1])]
+        return [entry for entry in self.entries
+                if _match(entry.relpath.split("/"), parts)]
+
+
+def _match(parts, pattern):
+    if not pattern:
+        return not parts
+    if pattern[0] == "**":
+        return any(_match(parts[i:], pattern[1:])
+                   for i in range(len(parts) + 1))
+    return bool(parts) and fnmatchcase(parts[0], pattern[0]) and \
+        _match(parts[1:], pattern[1:])
@@ -5,6 +5,7 @@ from PyQt5.QtWidgets import (QLabel, QVBoxLayout, QLineEdit, QCheckBox,
                              QDialog, QFileDialog, QTreeWidget,
                              QTreeWidgetItem)
 from rpg.gui.dialogs import DialogChangelog, DialogSubpackage, DialogImport
+from rpg.gui.workers import TaskRunner
 from pathlib import Path
 from rpg.command import Command
 import subprocess
@@ -25,6 +26,8 @@ class Wizard(QtWidgets.QWizard):
         super(Wizard, self).__init__(parent)
 
         self.base = base
+        # analysis and build run in background, so the window doesn't freeze
+        self.runner = TaskRunner(base, self)
         self.setWindowTitle(self.tr("RPG"))
         self.setWizardStyle(self.ClassicStyle)
 
@@ -46,6 +49,7 @@ class ImportPage(QtWidgets.QWizardPage):
         super(ImportPage, self).__init__(parent)
 
         self.base = Wizard.base
+        self.runner = Wizard.runner
 
         self.setTitle(self.tr("Beginning"))
         self.setSubTitle(self.tr("Fill in fields and import " +
@@ -183,16 +187,36 @@ class ImportPage(QtWidgets.QWizardPage):
         # Verifying path
         path = Path(self.importEdit.text())
         if(path.exists()):
-            self.base.spec.Name = self.nameEdit.text()
-            self.base.spec.Version = self.versionEdit.text()
-            self.base.spec.Release = self.releaseEdit.text()
-            self.base.spec.License = self.licenseEdit.text()
-            self.base.spec.URL = self.URLEdit.text()
-            self.base.spec.Summary = self.summaryEdit.text()
-            self.base.spec.description = self.descriptionEdit.text()
-            self.base.spec.Source = self.importEdit.text().strip()
-            self.base.process_archive_or_dir(self.base.spec.Source)
-            self.base.run_raw_sources_analysis()
+            # changes of spec made by speculative analysis of previous
+            # source are reverted in background, fields are set after that
+            self.runner.discard("patched")
+            source = self.importEdit.text().strip()
+            fields = {"Name": self.nameEdit.text(),
+                      "Version": self.versionEdit.text(),
+                      "Release": self.releaseEdit.text(),
+                      "License": self.licenseEdit.text(),
+                      "URL": self.URLEdit.text(),
+                      "Summary": self.summaryEdit.text(),
+                      "description": self.descriptionEdit.text(),
+                      "Source": source}
+            if not self.runner.run(
+                    "import", source,
+                    [("Reading project details",
+                      lambda: self._set_fields(fields)),
+                     ("Extracting sources",
+                      lambda: self.base.process_archive_or_dir(source)),
+                     ("Analysing sources",
+                      self.base.run_raw_sources_analysis)],
+                    "Importing sources"):
+                return False
+            # patches are rarely added, so patched sources are analysed
+            # while the user looks at the next page
+            self.runner.speculate(
+                "patched", [],
+                [("Applying patches", lambda: self.base.apply_patches([])),
+                 ("Analysing patched sources",
+                  self.base.run_patched_sources_analysis),
+                 ("Starting build", self.base.speculate_build)])
             self.importEdit.setStyleSheet("")
             return True
         else:
@@ -204,6 +228,10 @@ class ImportPage(QtWidgets.QWizardPage):
                                           "rgb(233,233,233);}")
             return False
 
+    def _set_fields(self, fields):
+        for key, value in fields.items():
+            setattr(self.base.spec, key, value)
+
     def nextId(self):
         ''' [int] Function that determines the next page after the current one
             - returns integer value and then checks, which value is page"
@@ -223,6 +251,8 @@ class ScriptsPage(QtWidgets.QWizardPage):
         super(ScriptsPage, self).__init__(parent)
 
         self.base = Wizard.base
+        self.runner = Wizard.runner
+        self.speculation = None
 
         self.setTitle(self.tr("Scripts page"))
         self.setSubTitle(self.tr("Write scripts"))
@@ -272,6 +302,10 @@ class ScriptsPage(QtWidgets.QWizardPage):
         self.base.spec.check = Command(self.checkEdit.toPlainText())
         if self.buildArchCheckbox.isChecked():
             self.base.spec.BuildArch = "noarch"
+        # restarts background build if the user changed the scripts, the
+        # old one is discarded in background thread
+        self.speculation = self.runner.start(
+            [("Starting build", self.base.speculate_build)])
         return True
 
     def nextId(self):
@@ -283,6 +317,7 @@ class PatchesPage(QtWidgets.QWizardPage):
         super(PatchesPage, self).__init__(parent)
 
         self.base = Wizard.base
+        self.runner = Wizard.runner
 
         self.setTitle(self.tr("Patches, documents and changelog page"))
         self.setSubTitle(self.tr("\n"))
@@ -366,9 +401,14 @@ class PatchesPage(QtWidgets.QWizardPage):
         for i in range(0, self.itemsCount):
             self.pathes.append(self.listPatches.item(i).text())
 
-        self.base.apply_patches(self.pathes)
-        self.base.run_patched_sources_analysis()
-        return True
+        pathes = list(self.pathes)
+        return self.runner.run(
+            "patched", pathes,
+            [("Applying patches", lambda: self.base.apply_patches(pathes)),
+             ("Analysing patched sources",
+              self.base.run_patched_sources_analysis),
+             ("Starting build", self.base.speculate_build)],
+            "Analysing patched sources")
 
     def nextId(self):
         return Wizard.PageScripts
@@ -384,6 +424,7 @@ class RequiresPage(QtWidgets.QWizardPage):
         super(RequiresPage, self).__init__(parent)
 
         self.base = Wizard.base
+        self.runner = Wizard.runner
 
         self.setTitle(self.tr("Requires page"))
         self.setSubTitle(self.tr("Write requires and provides"))
@@ -421,11 +462,14 @@ class RequiresPage(QtWidgets.QWizardPage):
         self.base.spec.BuildRequires = self.base.spec.BuildRequires.splitlines()
         self.base.spec.Requires = self.base.spec.Requires.splitlines()
         self.base.spec.Provides = self.base.spec.Provides.splitlines() 
-        self.base.build_project()
-        self.base.run_compiled_analysis()
-        self.base.install_project()
-        self.base.run_installed_analysis()
-        return True
+        return self.runner.run(
+            "build", None,
+            [("Building project", self.base.build_project),
+             ("Analysing compiled project", self.base.run_compiled_analysis),
+             ("Installing project", self.base.install_project),
+             ("Analysing installed project",
+              self.base.run_installed_analysis)],
+            "Building project")
 
     def nextId(self):
         return Wizard.PageSubpackages
@@ -0,0 +1,159 @@
+from PyQt5.QtCore import (QObject, QRunnable, QThreadPool, QEventLoop,
+                          pyqtSignal)
+from PyQt5.QtWidgets import QProgressDialog
+from rpg.plugin_engine import Cancelled
+from threading import Lock
+import logging
+import traceback
+
+
+class TaskSignals(QObject):
+
+    # index of the step that started and its description
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal()
+
+
+class Task(QRunnable):
+
+    """Runs steps - list of (description, callable) tuples - of Base in
+       background thread. Result is in success, cancelled and error
+       attributes once finished signal is emitted."""
+
+    def __init__(self, base, steps):
+        super(Task, self).__init__()
+        self.setAutoDelete(False)
+        self.base = base
+        self.steps = steps
+        self.signals = TaskSignals()
+        self.running = False
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._lock = Lock()
+        self._on_finish = []
+
+    @property
+    def success(self):
+        return self.done and not self.cancelled and self.error is None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.running:
+            self.base.cancel()
+
+    def on_finish(self, callback):
+        """calls callback in background thread when task finishes (before
+           next task starts) or right away if it has already finished"""
+        with self._lock:
+            if not self.done:
+                self._on_finish.append(callback)
+                return
+        callback()
+
+    def run(self):
+        try:
+            if self.cancelled:
+                return
+            self.base.reset_cancel()
+            self.running = True
+            for i, (description, step) in enumerate(self.steps):
+                self.signals.progress.emit(i, description)
+                if self.cancelled:
+                    raise Cancelled()
+                self.base.check_cancelled()
+                step()
+        except Cancelled:
+            self.cancelled = True
+        except Exception:
+            self.error = traceback.format_exc()
+            logging.error("background task failed:\n%s" % self.error)
+        finally:
+            self.running = False
+            with self._lock:
+                self.done = True
+                callbacks, self._on_finish = self._on_finish, []
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception:
+                    logging.error("callback of background task failed:\n%s"
+                                  % traceback.format_exc())
+            self.signals.finished.emit()
+
+
+class TaskRunner:
+
+    """Executes Tasks one after another in background thread, so the GUI
+       stays responsive and Base is never used by two tasks at once.
+       Work whose inputs are already known can be started speculatively
+       and claimed later when the user confirms the inputs."""
+
+    def __init__(self, base, parent=None):
+        self.base = base
+        self.parent = parent
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        # name -> (inputs, task, spec snapshot taken before the task)
+        self._speculative = {}
+
+    def start(self, steps):
+        task = Task(self.base, steps)
+        self.pool.start(task)
+        return task
+
+    def wait(self, task, title):
+        """shows progress of task until it finishes, returns True if it
+           finished successfully. Dialog lets user cancel the task."""
+
+        if not task.done:
+            dialog = QProgressDialog(title, "Cancel", 0, len(task.steps),
+                                     self.parent)
+            dialog.setMinimumDuration(300)
+            loop = QEventLoop()
+            task.signals.progress.connect(
+                lambda i, description: (dialog.setValue(i),
+                                        dialog.setLabelText(description)))
+            task.signals.finished.connect(loop.quit)
+            dialog.canceled.connect(task.cancel)
+            # task could finish before signals were connected
+            if not task.done:
+                loop.exec_()
+            dialog.reset()
+        return task.success
+
+    def speculate(self, name, inputs, steps):
+        """starts steps in background before user confirms their inputs"""
+
+        self.discard(name)
+        snapshot = self.base.snapshot_spec()
+        self._speculative[name] = (inputs, self.start(steps), snapshot)
+
+    def discard(self, name):
+        """cancels speculative work without waiting for it, its changes of
+           spec are reverted when it stops"""
+
+        _, task, snapshot = self._speculative.pop(name, (None, None, None))
+        if task:
+            self._cancel(task, snapshot)
+
+    def _cancel(self, task, snapshot):
+        task.cancel()
+        # runs in background thread, so the next task sees restored spec
+        task.on_finish(lambda: self.base.restore_spec(snapshot))
+
+    def run(self, name, inputs, steps, title):
+        """runs steps with confirmed inputs and waits for them, result of
+           speculative work of the same name is used if it had the same
+           inputs. Returns True on success."""
+
+        speculative = self._speculative.pop(name, None)
+        if speculative:
+            spec_inputs, task, snapshot = speculative
+            if spec_inputs == inputs:
+                if self.wait(task, title):
+                    return True
+                self.base.restore_spec(snapshot)
+                return False
+            self._cancel(task, snapshot)
+        return self.wait(self.start(steps), title)
@@ -1,11 +1,24 @@
-from os.path import expanduser
-from subprocess import call, check_output, PIPE, Popen, STDOUT
-from rpg.utils import copy_file
-from rpg.command import Command
+from hashlib import sha1
+from subprocess import check_output, STDOUT
+from rpg.checksum import file_digest
+from pathlib import Path
+from tempfile import mkdtemp
+import asyncio
+import logging
+import os
+import shutil
+import time
 
 
 class PackageBuilder:
 
+    mock = "mock"
+
+    def __init__(self, cache_dir=None):
+        """built SRPMs are stored in cache_dir (pathlib.Path) if given and
+           reused while spec file and tarball are the same"""
+        self.cache_dir = cache_dir
+
     def _get_last_word(self, args):
         words = args.split()
         word_count = len(words)
@@ -22,40 +35,238 @@ class PackageBuilder:
                 _ret.append(str(line).replace('\n', ''))
         return _ret
 
-    @staticmethod
-    def build_srpm(spec_file, tarball, srpm_output_path):
-        p = PackageBuilder()
-        call(["rpmdev-setuptree", ""])
-        user_home = expanduser("~")
-        copy_file(str(spec_file), user_home + "/rpmbuild/SPECS/")
-        copy_file(str(tarball), user_home + "/rpmbuild/SOURCES/")
-        output = Command("rpmbuild -bs " + user_home + "/rpmbuild/SPECS/" 
-            + spec_file.name).execute()
-        srpm_path = p._get_last_word(output)
-        Command("mv " + str(srpm_path) + " " + str(srpm_output_path)).execute()
-        
-    def build_rpm(self, srpm_path, distro, arch):
+    def build_srpm(self, spec_file, tarball, srpm_output_path):
+        """builds SRPM from spec_file and tarball in its own temporary
+           rpmbuild tree and moves it to srpm_output_path dir, returns path
+           of SRPM. SRPM is built only once for the same spec and tarball
+           if cache_dir is set."""
+        spec_file = Path(str(spec_file))
+        tarball = Path(str(tarball))
+        output_dir = Path(str(srpm_output_path))
+        cached_dir = None
+        if self.cache_dir:
+            key = sha1((file_digest(str(spec_file)) +
+                        file_digest(str(tarball))).encode()).hexdigest()
+            cached_dir = self.cache_dir / key
+            for cached in cached_dir.glob("*.src.rpm"):
+                logging.info("using cached SRPM %s" % str(cached))
+                shutil.copy2(str(cached), str(output_dir))
+                return output_dir / cached.name
+        topdir = Path(mkdtemp(prefix="rpg-rpmbuild-"))
+        try:
+            for subdir in ("SPECS", "SOURCES", "SRPMS"):
+                (topdir / subdir).mkdir()
+            shutil.copy2(str(spec_file), str(topdir / "SPECS"))
+            shutil.copy2(str(tarball), str(topdir / "SOURCES"))
+            output = check_output(
+                ["rpmbuild", "-bs", "--define", "_topdir %s" % str(topdir),
+                 str(topdir / "SPECS" / spec_file.name)]).decode("utf-8")
+            srpm_path = Path(self._get_last_word(output))
+            if cached_dir:
+                cached_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(str(srpm_path), str(cached_dir))
+            shutil.move(str(srpm_path), str(output_dir / srpm_path.name))
+        finally:
+            shutil.rmtree(str(topdir))
+        return output_dir / srpm_path.name
+
+    def build_rpm(self, srpm_path, distro, arch, result_dir=None,
+                  cpus=None, output=None):
         """builds RPM package in mock from given spec_file and tarball,
-           returns None or string in case of error occurrence"""
-        p = Popen(
-            ["mock", "-r", distro, srpm_path], stdout=PIPE, stderr=STDOUT)
-        line = ""
-        logs = ""
-        while p.poll() is None:
-            line = str(p.stdout.readline())
-            if "INFO: Results and/or logs in:" in line:
-                logs = line
-        result = str(self._get_last_word(logs).replace("\\n'", ""))
-        if not "Finish: run" in line:
-            return self._parseError(result)
-    
+           returns None or list of build.log lines in case of error
+           occurrence. Build uses at most cpus CPUs if given."""
+        return asyncio.run(self.build_rpm_async(
+            srpm_path, distro, arch, result_dir, cpus, output))
+
+    async def build_rpm_async(self, srpm_path, distro, arch, result_dir=None,
+                              cpus=None, output=None):
+        """coroutine version of build_rpm, every line of mock output is
+           passed to output callable together with MockOutput state
+           as soon as it is printed"""
+        cmd = [self.mock, "-r", mock_root(distro, arch)]
+        if result_dir:
+            cmd.append("--resultdir=" + str(result_dir))
+        if cpus:
+            cmd.append("--define=_smp_ncpus_max %d" % cpus)
+        process = await asyncio.create_subprocess_exec(
+            *(cmd + [str(srpm_path)]), stdout=asyncio.subprocess.PIPE,
+            stderr=STDOUT, limit=2 ** 24)
+        state = MockOutput(result_dir)
+        async for line in process.stdout:
+            line = line.decode("utf-8", "replace").rstrip("\n")
+            state.feed(line)
+            if output:
+                output(line, state)
+        returncode = await process.wait()
+        if returncode or not state.finished:
+            try:
+                errors = self._parse_error(state.result_dir)
+            except (OSError, TypeError):
+                errors = []
+            return errors or state.errors or \
+                ["mock exited with status %d: %s"
+                 % (returncode, state.last_line)]
+
     def build(self, spec_file, tarball, distro=None, arch=None):
         """builds RPM package with build_srpm and build_rpm"""
-        # FIXME: completely broken
-        
-        # Get home directory
-        srpm_output_path = expanduser("~")
-        # Build srpm pakcage from given spec_file and tarball
-        self.build_srpm(spec_file, tarball, srpm_output_path)
-        # Build RPM package
-        self.build_rpm(srpm_path, distro, arch)
+        srpm_output_path = mkdtemp(prefix="rpg-srpm-")
+        try:
+            # Build srpm pakcage from given spec_file and tarball
+            srpm_path = self.build_srpm(spec_file, tarball, srpm_output_path)
+            # Build RPM package
+            return self.build_rpm(srpm_path, distro, arch)
+        finally:
+            shutil.rmtree(srpm_output_path)
+
+
+def mock_root(distro, arch):
+    """returns name of mock config for distro (e.g. fedora-21) and arch"""
+    if arch and not distro.endswith("-" + arch):
+        return "%s-%s" % (distro, arch)
+    return distro
+
+
+class MockOutput:
+
+    """state of mock build parsed incrementally from its output"""
+
+    def __init__(self, result_dir=None):
+        self.result_dir = str(result_dir) if result_dir else None
+        self.last_line = ""
+        self.errors = []
+        self.finished = False
+
+    @property
+    def failed(self):
+        return bool(self.errors)
+
+    def feed(self, line):
+        if not line.strip():
+            return
+        self.last_line = line.strip()
+        if "INFO: Results and/or logs in:" in line:
+            self.result_dir = line.split()[-1]
+        elif "ERROR:" in line or "EXCEPTION" in line:
+            self.errors.append(line.strip())
+        self.finished = "Finish: run" in line
+
+
+class BuildResult:
+
+    """result of one mock build"""
+
+    def __init__(self, distro, arch, errors, duration, result_dir):
+        self.distro = distro
+        self.arch = arch
+        self.errors = errors or []
+        self.duration = duration
+        self.result_dir = result_dir
+
+    @property
+    def success(self):
+        return not self.errors
+
+    @property
+    def target(self):
+        return mock_root(self.distro, self.arch)
+
+
+class BuildReport(list):
+
+    """list of BuildResults of all targets in order they were requested"""
+
+    @property
+    def success(self):
+        return all(result.success for result in self)
+
+    @property
+    def failed(self):
+        return [result for result in self if not result.success]
+
+    def __str__(self):
+        lines = []
+        for result in self:
+            lines.append("%-30s %-7s %8.1f s" % (
+                result.target, "OK" if result.success else "FAILED",
+                result.duration))
+            lines += ["    " + error for error in result.errors]
+        return "\n".join(lines)
+
+
+class BuildScheduler:
+
+    """Runs mock builds of one SRPM for several targets concurrently.
+       Number of concurrent builds is limited by workers, by max_memory
+       (in MiB, available memory by default) divided by memory_per_build
+       and CPUs (max_cpus, all by default) are split between them."""
+
+    def __init__(self, package_builder, workers=0, max_cpus=0, max_memory=0,
+                 memory_per_build=2048):
+        self.package_builder = package_builder
+        self.workers = workers
+        self.max_cpus = max_cpus or os.cpu_count() or 1
+        self.max_memory = max_memory or _available_memory()
+        self.memory_per_build = memory_per_build
+
+    def _worker_count(self, targets):
+        workers = self.workers or self.max_cpus
+        if self.max_memory:
+            workers = min(workers, self.max_memory // self.memory_per_build)
+        return max(1, min(workers, len(targets)))
+
+    def run(self, srpm_path, targets, result_root, output=None):
+        """builds srpm_path for targets - list of (distro, arch) tuples,
+           results of every target are stored in its directory in
+           result_root. Lines of mock output are passed to output callable
+           together with target name and MockOutput state.
+           Returns BuildReport."""
+        return asyncio.run(self.run_async(srpm_path, targets, result_root,
+                                          output))
+
+    async def run_async(self, srpm_path, targets, result_root, output=None):
+        """coroutine version of run for callers with running event loop"""
+        workers = self._worker_count(targets)
+        cpus = max(1, self.max_cpus // workers)
+        logging.info("building %d targets with %d workers, %d CPUs each"
+                     % (len(targets), workers, cpus))
+        semaphore = asyncio.Semaphore(workers)
+
+        async def build(target):
+            distro, arch = target
+            name = mock_root(distro, arch)
+            result_dir = Path(str(result_root)) / name
+            target_output = None
+            if output:
+                def target_output(line, state):
+                    output(name, line, state)
+            async with semaphore:
+                start = time.time()
+                try:
+                    errors = await self.package_builder.build_rpm_async(
+                        srpm_path, distro, arch, result_dir, cpus,
+                        target_output)
+                except Exception as err:
+                    errors = [str(err)]
+            result = BuildResult(distro, arch, errors, time.time() - start,
+                                 result_dir)
+            logging.info("build of %s %s" % (
+                result.target, "finished" if result.success else "failed"))
+            return result
+
+        return BuildReport(await asyncio.gather(*map(build, targets)))
+
+
+def _available_memory():
+    """returns available memory in MiB or 0 if it is unknown"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * \
+            os.sysconf("SC_PAGE_SIZE") // 2 ** 20
+    except (ValueError, OSError):
+        return 0
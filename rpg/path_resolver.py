@@ -0,0 +1,105 @@
+from rpg.utils import atomic_write
+import logging
+import os
+import pickle
+
+# system header directories, headers in them that no package owns are
+# required by their directory instead
+INCLUDE_DIRS = ["/usr/include"]
+
+
+class PathResolver:
+
+    """Resolves file paths found by plugins (header directories, module
+       files) to names of packages that own them. Paths are looked up
+       all at once in SackIndex, or in DNF sack when the index is not
+       available. Answers are remembered in cache file path
+       (pathlib.Path) while the index checksum stays the same."""
+
+    def __init__(self, sack_index=None, sack=None, path=None):
+        self.sack_index = sack_index
+        self.sack = sack
+        self.path = path
+        self._checksum = None
+        self._owners = {}
+        self._changed = False
+        if path:
+            try:
+                with open(str(path), "rb") as cache_file:
+                    self._checksum, self._owners = pickle.load(cache_file)
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                logging.warn("corrupted path cache %s: %s"
+                             % (str(path), err))
+
+    @property
+    def _index_ready(self):
+        return self.sack_index is not None and \
+            self.sack_index.checksum is not None
+
+    def resolve(self, paths):
+        """returns dict path -> package name, unresolved paths are
+           missing in it"""
+
+        paths = set(paths)
+        if self._index_ready:
+            if self._checksum != self.sack_index.checksum:
+                self._checksum = self.sack_index.checksum
+                self._owners = {}
+            unknown = paths.difference(self._owners)
+            if unknown:
+                found = self.sack_index.owners(unknown)
+                for path in unknown:
+                    self._owners[path] = found.get(path)
+                self._changed = True
+            owners = self._owners
+        elif self.sack is not None:
+            owners = {}
+            for pkg in self.sack.query().filter(file=list(paths)):
+                for path in paths.intersection(pkg.files):
+                    if path not in owners or pkg.name < owners[path]:
+                        owners[path] = pkg.name
+        else:
+            return {}
+        return dict((path, owners[path]) for path in paths
+                    if owners.get(path))
+
+    def save(self):
+        if not self.path or not self._changed:
+            return
+        try:
+            with atomic_write(self.path) as f:
+                pickle.dump((self._checksum, self._owners), f)
+            self._changed = False
+        except OSError as err:
+            logging.warn("can't save path cache %s: %s"
+                         % (str(self.path), err))
+
+
+def replace_paths(values, owners, fallback=None):
+    """returns values with paths replaced by package names from owners
+       (dict returned by PathResolver.resolve) without duplicates,
+       unresolved paths are kept or replaced by fallback(path)"""
+
+    resolved = []
+    seen = set()
+    for value in values:
+        if value in owners:
+            value = owners[value]
+        elif fallback and str(value).startswith("/"):
+            value = fallback(value)
+        if value not in seen:
+            seen.add(value)
+            resolved.append(value)
+    return resolved
+
+
+def include_dir_fallback(path):
+    """returns directory of header from INCLUDE_DIRS, other paths are
+       returned unchanged"""
+
+    if any(path.startswith(include_dir + os.sep)
+           for include_dir in INCLUDE_DIRS):
+        return os.path.dirname(path)
+    return path
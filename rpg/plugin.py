@@ -2,6 +2,31 @@ class Plugin:
 
     """class from which are plugins derived"""
 
+    # how PluginEngine runs phase methods of the plugin when parallel
+    # execution is enabled - "thread" (default), "process" (CPU bound pure
+    # python plugins, the dnf sack is not passed to them then) or "serial"
+    executor = "thread"
+
+    # has to be increased when plugin output changes, results of previous
+    # versions stored in analysis cache are not used then
+    version = 1
+
+    # plugins with higher priority are executed first among plugins that
+    # don't depend on each other
+    priority = 0
+
+    # names of Spec fields (e.g. "Requires", "build", "files") the plugin
+    # reads and writes - plugin reading a field runs after plugins that
+    # write it. None means that any field can be read, cached results of
+    # the plugin are then used only if the whole spec is unchanged
+    reads = None
+    writes = []
+
+    # names of plugin classes this plugin is executed after / before
+    # when they are subscribed to the same phase
+    after = []
+    before = []
+
     # def extracted(self, project_dir, spec, sack):
     #     # :api
     #     pass
@@ -1,12 +1,21 @@
-from rpg.plugin import Plugin
-import inspect
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                Future)
+from rpg.plugin_manifest import import_plugin_file, plugin_classes
+from rpg.plugin_registry import PluginEntry, PluginRegistry
+from rpg.spec import SpecDelta
+from rpg.file_index import FileIndex
+from rpg.profiler import run_measured
 import logging
-import os.path
 import traceback
 
 phases = ("extracted", "patched", "compiled", "installed", "package_build")
 
 
+class Cancelled(Exception):
+
+    """raised when execution is cancelled by setting cancel event"""
+
+
 class PluginEngine:
 
     """PluginEngine class is responsible for executing properly plugins.
@@ -14,74 +23,339 @@ class PluginEngine:
        it subscribes to. That method takes pathlib.Path instance of project
        root dir, spec object and dnf sack."""
 
-    def __init__(self, spec, sack):
+    def __init__(self, spec, sack, jobs=1):
         self.spec = spec
         self.sack = sack
         self.plugins = set()
+        self.jobs = jobs
+        self.cache = None
+        # rpg.profiler.Profiler recording every executed plugin
+        self.profiler = None
+        # threading.Event, phase is stopped between plugins when it is set
+        # and spec is returned to the state before the phase
+        self.cancel_event = None
+        # rpg.plugin_manifest.PluginManifest, if set, plugins are imported
+        # when the first phase they subscribe to is executed
+        self.manifest = None
+        # plugins that are not imported yet
+        self.registry = PluginRegistry()
+        # plugin -> PluginEntry it was created from, entries are sent to
+        # worker processes instead of pickled plugins
+        self._entries = {}
 
-    def execute_phase(self, phase, project_dir):
-        """trigger all plugin methods that are subscribed to the phase"""
+    def execute_phase(self, phase, project_dir, checksum=None):
+        """trigger all plugin methods that are subscribed to the phase,
+           if cache is set, results are stored under checksum of phase
+           input (project_dir content) and reused next time"""
 
         if phase not in phases:
             logging.warn("tried to execute non-valid phase %s" % phase)
             return
         logging.info("plugin phase %s executed" % phase)
-        for plugin in self.plugins:
+        waves = self._phase_waves(phase)
+        key = None
+        if self.cache and checksum:
+            key = self._cache_key(phase, checksum, waves)
+            delta = self.cache.load(key)
+            if delta is not None:
+                logging.info("plugin phase %s results loaded from cache"
+                             % phase)
+                delta.apply(self.spec)
+                return
+        before = None
+        if key or self.cancel_event:
+            before = SpecDelta.snapshot(self.spec)
+        # one walk of project dir shared by all plugins of the phase, it's
+        # dropped afterwards, so long running processes don't keep it
+        FileIndex.of(project_dir, refresh=True)
+        failed = 0
+        try:
+            for wave in waves:
+                self._check_cancelled()
+                failed += self._execute_wave(wave, phase, project_dir)
+        except Cancelled:
+            logging.info("plugin phase %s cancelled" % phase)
+            SpecDelta(self.spec, before).apply(self.spec)
+            raise
+        finally:
+            FileIndex.drop(project_dir)
+        if key and not failed:
+            self.cache.store(key, SpecDelta(before, self.spec))
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise Cancelled()
+
+    def _execute_wave(self, wave, phase, project_dir):
+        """returns number of plugins that failed"""
+
+        if self.jobs > 1 and len(wave) > 1:
+            return self._execute_parallel(wave, phase, project_dir)
+        failed = 0
+        for plugin in wave:
+            self._check_cancelled()
+            plugin_name = plugin.__class__.__name__
+            logging.info("executing %s plugin" % plugin_name)
             try:
-                method = getattr(plugin, phase)
-            except AttributeError:
+                # plugin works on copy of spec, so changes of failed plugin
+                # are dropped like in parallel execution
+                self._add_profile(phase, plugin, _execute_plugin(
+                    plugin, phase, project_dir, self.spec, self.sack,
+                    self._cprofile_path(phase, plugin)))
+            except Exception as err:
+                _log_plugin_error(plugin_name, err)
+                failed += 1
+        return failed
+
+    def _cprofile_path(self, phase, plugin):
+        if self.profiler:
+            return self.profiler.cprofile_path(phase,
+                                               plugin.__class__.__name__)
+
+    def _add_profile(self, phase, plugin, result):
+        """applies result of _execute_plugin to spec and passes its
+           measurements to profiler"""
+
+        delta, record = result
+        delta.apply(self.spec)
+        if self.profiler:
+            self.profiler.add(phase, plugin.__class__.__name__, record,
+                              delta.keys)
+
+    def _cache_key(self, phase, checksum, waves):
+        """phase results depend on input checksum, plugins (and their
+           versions) and values of spec fields plugins read"""
+
+        parts = [checksum, phase]
+        reads = set()
+        state = SpecDelta._state(self.spec)
+        for wave in waves:
+            for plugin in wave:
+                parts.append("%s.%s:%s" % (plugin.__class__.__module__,
+                                           plugin.__class__.__name__,
+                                           getattr(plugin, "version", 1)))
+                if getattr(plugin, "reads", None) is None:
+                    # undeclared reads, plugin depends on whole spec
+                    reads.update(state)
+                reads.update(_attr_list(plugin, "reads"))
+        for field in sorted(reads):
+            parts.append("%s=%r" % (field, state.get(field)))
+        return self.cache.key(*parts)
+
+    def _phase_waves(self, phase):
+        """returns list of waves of plugins subscribed to the phase, plugins
+           of the wave don't depend on each other, every wave depends only
+           on the previous ones"""
+
+        self._import_lazy_plugins(phase)
+        plugins = [plugin for plugin in self.plugins
+                   if callable(getattr(plugin, phase, None))]
+        return _plugin_waves(plugins)
+
+    def _import_lazy_plugins(self, phase):
+        for entry in self.registry.take(phase):
+            try:
+                cls = entry.load()
+            except Exception:
+                logging.warn("plugin %s not loaded (%s)"
+                             % (entry.name, entry.location))
                 continue
-            if callable(method):
-                plugin_name = plugin.__class__.__name__
-                logging.info("executing %s plugin" % plugin_name)
+            self._add_plugin(cls, entry.location, entry)
+
+    def _execute_parallel(self, plugins, phase, project_dir):
+        """every plugin works on its own copy of spec, changes are merged
+           afterwards in the same order as serial execution would make them"""
+
+        before = SpecDelta.snapshot(self.spec)
+        results = []
+        with ThreadPoolExecutor(self.jobs) as threads:
+            processes = None
+            if any(_executor(p) == "process" for p in plugins):
+                processes = ProcessPoolExecutor(self.jobs)
+            for plugin in plugins:
+                executor = _executor(plugin)
+                if executor == "process":
+                    logging.info("executing %s plugin"
+                                 % plugin.__class__.__name__)
+                    results.append(processes.submit(
+                        _execute_plugin, self._entries.get(plugin, plugin),
+                        phase, project_dir,
+                        before, None, self._cprofile_path(phase, plugin)))
+                elif executor == "thread":
+                    logging.info("executing %s plugin"
+                                 % plugin.__class__.__name__)
+                    results.append(threads.submit(
+                        _execute_plugin, plugin, phase, project_dir,
+                        before, self.sack, self._cprofile_path(phase, plugin)))
+                else:
+                    results.append(None)
+            if processes:
+                processes.shutdown()
+        # serial plugins run alone after all the others finished
+        for i, plugin in enumerate(plugins):
+            if results[i] is None:
+                self._check_cancelled()
+                logging.info("executing %s plugin" % plugin.__class__.__name__)
+                results[i] = Future()
                 try:
-                    method(project_dir, self.spec, self.sack)
+                    results[i].set_result(_execute_plugin(
+                        plugin, phase, project_dir, before, self.sack,
+                        self._cprofile_path(phase, plugin)))
                 except Exception as err:
-                    msg = ''.join(traceback.format_tb(err.__traceback__)[1:])
-                    logging.warn(
-                        "error during executing plugin %s:\n%s"
-                        % (plugin_name, msg))
+                    results[i].set_exception(err)
+        self._check_cancelled()
+        failed = 0
+        for plugin, result in zip(plugins, results):
+            try:
+                self._add_profile(phase, plugin, result.result())
+            except Exception as err:
+                _log_plugin_error(plugin.__class__.__name__, err)
+                failed += 1
+        return failed
 
     def load_plugins(self, path, excludes=[]):
-        """finds all plugins in dir and it's subdirectories"""
-
-        pyfiles = path.rglob('*.py')
-        for pyfile in pyfiles:
-            splitted_path = _os_path_split(str(pyfile)[:-3])
-            path_to_file = '.'.join(splitted_path[:-1])
-            imported_path = __import__(
-                path_to_file, fromlist=[splitted_path[-1]])
-            imported_file = getattr(imported_path, splitted_path[-1])
-            plugin_file = imported_file.__name__
-            for var_name in dir(imported_file):
-                attr = getattr(imported_file, var_name)
-                if inspect.isclass(attr) and attr != Plugin and \
-                   issubclass(attr, Plugin):
-                    try:
-                        plugin = attr()
-                        plugin_name = plugin.__class__.__name__
-                        if not plugin_name in excludes:
-                            self.plugins.add(plugin)
-                            logging.info("plugin %s loaded (%s)" %
-                                         (plugin_name, plugin_file))
-                        else:
-                            logging.info("plugin %s was excluded (%s)" %
-                                         (plugin_name, plugin_file))
-                    except Exception:
-                        logging.warn("plugin %s not loaded (%s)" %
-                                     (plugin_name, plugin_file))
-
-
-def _os_path_split(path):
-    parts = []
-    while True:
-        newpath, tail = os.path.split(path)
-        if newpath == path:
-            assert not tail
-            if path:
-                parts.append(path)
-            break
-        parts.append(tail)
-        path = newpath
-    parts.reverse()
-    return parts
+        """finds all plugins in dir and it's subdirectories, with manifest
+           they are only listed and imported later"""
+
+        if self.manifest:
+            for pyfile, name, plugin_phases, priority in \
+                    self.manifest.scan(path):
+                if name in excludes:
+                    logging.info("plugin %s was excluded (%s)"
+                                 % (name, pyfile))
+                else:
+                    self.registry.add(PluginEntry(name, pyfile, plugin_phases,
+                                                  priority))
+            self.manifest.save()
+            return
+        for pyfile in sorted(path.rglob('*.py')):
+            try:
+                module = import_plugin_file(pyfile)
+            except Exception as err:
+                logging.warn("plugin file %s not loaded: %s" % (pyfile, err))
+                continue
+            for cls in plugin_classes(module):
+                if cls.__name__ in excludes:
+                    logging.info("plugin %s was excluded (%s)" %
+                                 (cls.__name__, module.__name__))
+                else:
+                    self._add_plugin(cls, module.__name__, PluginEntry(
+                        cls.__name__, str(pyfile.resolve()),
+                        priority=getattr(cls, "priority", 0)))
+
+    def load_entry_points(self, excludes=[]):
+        """finds plugins registered as entry points by installed
+           distributions, they are imported when their phase is executed"""
+
+        self.registry.discover(self.manifest, excludes)
+        if self.manifest:
+            self.manifest.save()
+
+    def _add_plugin(self, cls, plugin_file, entry=None):
+        try:
+            plugin = cls()
+        except Exception:
+            logging.warn("plugin %s not loaded (%s)"
+                         % (cls.__name__, plugin_file))
+            return
+        self.plugins.add(plugin)
+        if entry:
+            self._entries[plugin] = entry
+        logging.info("plugin %s loaded (%s)" % (cls.__name__, plugin_file))
+
+
+def _plugin_waves(plugins):
+    """orders plugins into waves by their after/before constraints and by
+       fields they read and write. Plugins are sorted by priority (higher
+       first) and name inside of the wave, so order of execution is always
+       the same."""
+
+    plugins = sorted(plugins, key=lambda p: (-getattr(p, "priority", 0),
+                                             p.__class__.__name__,
+                                             p.__class__.__module__))
+    nodes = range(len(plugins))
+    by_name = {}
+    for node in nodes:
+        by_name.setdefault(plugins[node].__class__.__name__, []).append(node)
+    successors = dict((node, set()) for node in nodes)
+    for node in nodes:
+        for name in _attr_list(plugins[node], "after"):
+            for other in by_name.get(name, []):
+                successors[other].add(node)
+        for name in _attr_list(plugins[node], "before"):
+            successors[node].update(by_name.get(name, []))
+        successors[node].discard(node)
+
+    def reachable(start, goal):
+        stack, seen = [start], set()
+        while stack:
+            node = stack.pop()
+            if node == goal:
+                return True
+            if node not in seen:
+                seen.add(node)
+                stack.extend(successors[node])
+        return False
+
+    # readers of a field go after its writers, unless constraints say
+    # otherwise
+    for writer in nodes:
+        writes = set(_attr_list(plugins[writer], "writes"))
+        for reader in nodes:
+            if reader == writer or \
+               not writes & set(_attr_list(plugins[reader], "reads")):
+                continue
+            if not reachable(reader, writer):
+                successors[writer].add(reader)
+
+    predecessors = dict((node, 0) for node in nodes)
+    for node in nodes:
+        for successor in successors[node]:
+            predecessors[successor] += 1
+    waves = []
+    remaining = set(nodes)
+    while remaining:
+        wave = sorted(n for n in remaining if not predecessors[n])
+        if not wave:
+            wave = [min(remaining)]
+            logging.warn("cyclic dependency between plugins %s, executing "
+                         "%s first" % (
+                             ", ".join(plugins[n].__class__.__name__
+                                       for n in sorted(remaining)),
+                             plugins[wave[0]].__class__.__name__))
+        for node in wave:
+            remaining.remove(node)
+            for successor in successors[node]:
+                predecessors[successor] -= 1
+        waves.append([plugins[node] for node in wave])
+    return waves
+
+
+def _attr_list(plugin, attr):
+    value = getattr(plugin, attr, [])
+    return value if isinstance(value, (list, tuple, set)) else []
+
+
+def _executor(plugin):
+    executor = getattr(plugin, "executor", "thread")
+    return executor if executor in ("thread", "process") else "serial"
+
+
+def _execute_plugin(plugin, phase, project_dir, spec, sack,
+                    cprofile_path=None):
+    """runs phase method of plugin (or of plugin described by PluginEntry)
+       on copy of spec and returns SpecDelta of changes it made and
+       measurements of the run"""
+
+    if isinstance(plugin, PluginEntry):
+        plugin = plugin.materialize()
+    working_spec = SpecDelta.snapshot(spec)
+    _, record = run_measured(getattr(plugin, phase),
+                             (project_dir, working_spec, sack), cprofile_path)
+    return SpecDelta(spec, working_spec), record
+
+
+def _log_plugin_error(plugin_name, err):
+    msg = ''.join(traceback.format_tb(err.__traceback__)[1:])
+    logging.warn("error during executing plugin %s:\n%s"
+                 % (plugin_name, msg))
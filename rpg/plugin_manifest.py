@@ -0,0 +1,184 @@
+from hashlib import sha1
+from importlib import import_module, util
+from pathlib import Path
+from rpg.plugin import Plugin
+from rpg.utils import atomic_write
+import inspect
+import json
+import logging
+import os
+import sys
+
+# has to be increased when format of saved manifest changes
+FORMAT = 2
+
+
+class PluginManifest:
+
+    """Persistent list of plugin classes found in plugin directories and
+       entry points, with phases they implement and their priority.
+       Python files are imported only if they changed (by mtime and size)
+       since the manifest was saved, entry points only if version of their
+       distribution changed. PluginEngine can then load plugins when their
+       phase is executed."""
+
+    def __init__(self, path):
+        """path of JSON file (pathlib.Path), it is created on first save"""
+
+        self.path = path
+        self._records = {}
+        self._changed = False
+        try:
+            with open(str(path)) as manifest:
+                saved = json.load(manifest)
+            if isinstance(saved, dict) and saved.get("format") == FORMAT:
+                self._records = saved["records"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as err:
+            logging.warn("corrupted plugin manifest %s: %s" % (path, err))
+
+    def scan(self, path):
+        """returns list of (python file, class name, phases, priority)
+           tuples of all plugins in dir path and its subdirectories"""
+
+        plugins = []
+        for pyfile in sorted(path.resolve().rglob('*.py')):
+            try:
+                stat = pyfile.stat()
+            except OSError:
+                continue
+            state = [stat.st_mtime_ns, stat.st_size]
+            record = self._records.get(str(pyfile))
+            if not record or record["state"] != state:
+                record = {"state": state,
+                          "plugins": _describe(_import_file, pyfile) or []}
+                self._records[str(pyfile)] = record
+                self._changed = True
+            plugins.extend((str(pyfile), name, phases, priority)
+                           for name, phases, priority in record["plugins"])
+        return plugins
+
+    def entry_point(self, entry_point):
+        """returns list with (class name, phases, priority) of plugin
+           registered as importlib.metadata.EntryPoint, it's empty if
+           version of distribution providing it is unknown"""
+
+        dist = getattr(entry_point, "dist", None)
+        if dist is None:
+            return []
+        key = "entry point %s %s: %s = %s" % (
+            dist.metadata["Name"], dist.version, entry_point.name,
+            entry_point.value)
+        if key not in self._records:
+            plugins = _describe(lambda ep: [ep.load()], entry_point)
+            if plugins is None:
+                return []
+            self._records[key] = {"plugins": plugins}
+            self._changed = True
+        return [tuple(plugin) for plugin in self._records[key]["plugins"]]
+
+    def save(self):
+        """writes manifest if scan found changed files"""
+
+        if not self._changed:
+            return
+        try:
+            with atomic_write(self.path, "w") as manifest:
+                json.dump({"format": FORMAT, "records": self._records},
+                          manifest, indent=1, sort_keys=True)
+            self._changed = False
+        except OSError as err:
+            logging.warn("can't save plugin manifest %s: %s"
+                         % (self.path, err))
+
+
+def import_plugin_file(pyfile):
+    """imports python file (pathlib.Path) and returns its module. Files
+       reachable from sys.path are imported under their package name,
+       others under name derived from their path."""
+
+    pyfile = Path(str(pyfile)).resolve()
+    name = _module_name(pyfile)
+    if name:
+        return import_module(name)
+    name = "rpg_plugin_%s" % sha1(str(pyfile).encode("utf-8")).hexdigest()
+    if name not in sys.modules:
+        spec = util.spec_from_file_location(name, str(pyfile))
+        module = util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            del sys.modules[name]
+            raise
+    return sys.modules[name]
+
+
+def plugin_classes(module):
+    """returns Plugin subclasses defined or imported in module"""
+
+    return [attr for attr in vars(module).values()
+            if inspect.isclass(attr) and attr != Plugin and
+            issubclass(attr, Plugin)]
+
+
+def _import_file(pyfile):
+    return plugin_classes(import_plugin_file(pyfile))
+
+
+def _describe(load_classes, source):
+    """returns [class name, phases, priority] of plugin classes returned
+       by load_classes(source), None if they can't be loaded"""
+
+    from rpg.plugin_engine import phases
+    try:
+        classes = load_classes(source)
+    except Exception as err:
+        logging.warn("plugins of %s not loaded: %s" % (source, err))
+        return None
+    return sorted([cls.__name__,
+                   [phase for phase in phases
+                    if callable(getattr(cls, phase, None))],
+                   getattr(cls, "priority", 0)]
+                  for cls in classes)
+
+
+def _module_name(pyfile):
+    """name of module pyfile is imported as. Module of regular package
+       (with __init__.py) is named relative to directory of its top level
+       package, the directory has to be on sys.path and the package can't
+       be shadowed by another one found earlier. Other modules are named
+       relative to the nearest sys.path entry, module that is already
+       imported wins."""
+
+    roots = set(Path(entry or os.curdir).resolve()
+                for entry in sys.path if isinstance(entry, str))
+    root, parts = pyfile.parent, [pyfile.stem]
+    while (root / "__init__.py").is_file():
+        parts.insert(0, root.name)
+        root = root.parent
+    if len(parts) > 1:
+        if root not in roots or \
+                not all(part.isidentifier() for part in parts):
+            return None
+        try:
+            spec = util.find_spec(parts[0])
+        except (ImportError, ValueError):
+            return None
+        init = root / parts[0] / "__init__.py"
+        if not spec or not spec.origin or Path(spec.origin).resolve() != init:
+            return None
+        return ".".join(parts)
+    names = []
+    for root in sorted(roots, key=lambda root: -len(root.parts)):
+        if root in pyfile.parents:
+            parts = pyfile.with_suffix("").relative_to(root).parts
+            if all(part.isidentifier() for part in parts):
+                names.append(".".join(parts))
+    for name in names:
+        module = sys.modules.get(name)
+        if module and getattr(module, "__file__", None) and \
+                Path(module.__file__).resolve() == pyfile:
+            return name
+    return names[0] if names else None
@@ -0,0 +1,111 @@
+from importlib import import_module
+from rpg.plugin_manifest import import_plugin_file
+import logging
+
+try:
+    from importlib import metadata
+except ImportError:
+    # python < 3.8, plugins can't be discovered as entry points
+    metadata = None
+
+# entry point group of plugins provided by installed distributions
+ENTRY_POINT_GROUP = "rpg.plugins"
+
+# plugin instances created by PluginEntry.materialize in this process
+_instances = {}
+
+
+class PluginEntry:
+
+    """Picklable description of plugin class - its name, location (path
+       of python file or "module:attribute" of entry point), phases it
+       subscribes to (None if they are unknown until the class is
+       imported) and priority. Class is imported only by load."""
+
+    def __init__(self, name, location, phases=None, priority=0):
+        self.name = name
+        self.location = location
+        self.phases = phases
+        self.priority = priority
+
+    def __repr__(self):
+        return "PluginEntry(%r, %r, %r, %r)" % (
+            self.name, self.location, self.phases, self.priority)
+
+    def subscribes(self, phase):
+        return self.phases is None or phase in self.phases
+
+    def load(self):
+        """imports and returns plugin class"""
+
+        if self.location.endswith(".py"):
+            return getattr(import_plugin_file(self.location), self.name)
+        module, _, attrs = self.location.split("[")[0].strip().partition(":")
+        obj = import_module(module)
+        for attr in attrs.split("."):
+            obj = getattr(obj, attr)
+        return obj
+
+    def materialize(self):
+        """returns instance of plugin shared by all callers in the process,
+           used by worker processes instead of unpickling plugins"""
+
+        key = (self.location, self.name)
+        if key not in _instances:
+            _instances[key] = self.load()()
+        return _instances[key]
+
+
+class PluginRegistry:
+
+    """Plugins that are known by their PluginEntry, but not imported yet.
+       Besides plugin directories, plugins are discovered as entry points
+       of group rpg.plugins, e.g. in setup.py of plugin distribution:
+
+           entry_points={"rpg.plugins": ["MyPlugin = my_rpg.plugin:MyPlugin"]}
+       """
+
+    def __init__(self, group=ENTRY_POINT_GROUP):
+        self.group = group
+        self.entries = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+    def discover(self, manifest=None, excludes=[]):
+        """adds entry points of installed distributions, their phases and
+           priority are read from manifest (rpg.plugin_manifest
+           .PluginManifest) if given, so plugins are not imported"""
+
+        for entry_point in _entry_points(self.group):
+            attr = entry_point.value.split(":")[-1].split("[")[0].strip()
+            if entry_point.name in excludes or attr in excludes:
+                logging.info("plugin %s was excluded (%s)"
+                             % (entry_point.name, entry_point.value))
+                continue
+            plugins = manifest.entry_point(entry_point) if manifest else []
+            if not plugins:
+                self.add(PluginEntry(entry_point.name, entry_point.value))
+            for name, phases, priority in plugins:
+                self.add(PluginEntry(name, entry_point.value, phases,
+                                     priority))
+            logging.info("plugin %s found (%s)"
+                         % (entry_point.name, entry_point.value))
+
+    def take(self, phase):
+        """removes and returns entries of plugins subscribed to phase"""
+
+        taken = [entry for entry in self.entries if entry.subscribes(phase)]
+        self.entries = [entry for entry in self.entries
+                        if not entry.subscribes(phase)]
+        return taken
+
+
+def _entry_points(group):
+    if metadata is None:
+        return []
+    try:
+        return metadata.entry_points(group=group)
+    except TypeError:
+        # python < 3.10
+        return metadata.entry_points().get(group, [])
@@ -1,33 +1,167 @@
 from rpg.plugin import Plugin
-from rpg.command import Command
-from tempfile import NamedTemporaryFile
-from os import unlink, path
-from re import compile
+from rpg.file_index import FileIndex
+from rpg.path_resolver import INCLUDE_DIRS
+from rpg.utils import process_map
+from os import path
+import os
+import re
+
+SOURCE_SUFFIXES = (".c", ".h", ".cc", ".cpp", ".cxx", ".hh", ".hpp", ".hxx")
+
+_comment_re = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"'
+                         r"|'(?:\\.|[^'\\\n])*'", re.DOTALL)
+_directive_re = re.compile(r"^[ \t]*#[ \t]*(\w+)(.*)$", re.MULTILINE)
+_include_re = re.compile(r'\s*(?:<([^>\n]+)>|"([^"\n]+)")')
+
+# state of conditional block after #if and after following #elif or #else,
+# "done" means that some previous branch was active
+_if_states = {"0": "skip", "1": "active"}
+_else_states = {
+    "elif": {"active": "done", "skip": "unknown", "unknown": "unknown",
+             "done": "done"},
+    "else": {"active": "done", "skip": "active", "unknown": "unknown",
+             "done": "done"}}
 
 
 class CPlugin(Plugin):
-    def patched(self, project_dir, spec, sack):
-        f = NamedTemporaryFile(delete=False, prefix="rpg_plugin_c_")
-        file_name = f.name
-        f.close()
 
-        out = Command(["find " + str(project_dir)
-                       + " -name *.c -o -name *.h"]).execute()
+    reads = []
+    writes = ["Requires", "BuildRequires"]
+    version = 3
 
-        files_list = [str(s) for s in out.splitlines()]
+    # directories searched for <...> includes after project_dir
+    system_include_dirs = list(INCLUDE_DIRS)
 
-        makedepend = "makedepend -w10000 -f" + file_name + " -I" \
-                     + str(project_dir) + " " + \
-                     ' '.join(files_list)
-        Command(makedepend).execute()
+    # worker processes parsing files, see rpg.utils.process_map
+    jobs = None
 
-        regex = compile(r'.*\.h')
-        regex2 = compile(str(project_dir) + ".*")
-        unlink(file_name + ".bak")
-        with open(file_name, "r") as f:
-            _ret_paths = list(set([path.dirname(s) for s in f.read().split()
-                                   if regex.match(s) and not regex2.match(s)]))
-        unlink(file_name)
+    def patched(self, project_dir, spec, sack):
+        index = FileIndex.of(project_dir)
+        project_dir = str(index.root)
+        sources = [str(entry.path) for entry in index.files()
+                   if entry.name.endswith(SOURCE_SUFFIXES)]
+        scanner = IncludeScanner([project_dir] + self.system_include_dirs,
+                                 self.jobs)
+        # headers are resolved to packages providing them by Base
+        _ret_paths = sorted(
+            header for header in scanner.scan(sources)
+            if not header.startswith(project_dir + os.sep))
 
         spec.Requires += _ret_paths
         spec.BuildRequires += _ret_paths
+
+
+class IncludeScanner:
+
+    """Finds all headers included directly or indirectly by C/C++ source
+       files. #include directives are read by simple preprocessor that
+       skips comments and #if 0 blocks (other conditions are considered
+       true), headers are searched in include_dirs like compiler does.
+       Every file is parsed only once and its includes are remembered
+       by path, size and mtime for other scans in the process."""
+
+    _memo = {}
+
+    def __init__(self, include_dirs, jobs=None):
+        self.include_dirs = [path.realpath(str(d)) for d in include_dirs]
+        self.jobs = jobs
+        self._resolved = {}
+
+    def scan(self, sources):
+        """returns set of paths of headers included by sources"""
+
+        includes = {}
+        headers = set()
+        level = sorted(set(path.realpath(str(source))
+                           for source in sources))
+        while level:
+            for parsed, found in zip(level, self._parse(level)):
+                includes[parsed] = found
+            next_level = set()
+            for parsed in level:
+                for name, quoted in includes[parsed]:
+                    header = self._resolve(name, quoted, path.dirname(parsed))
+                    if header and header not in headers:
+                        headers.add(header)
+                        if header not in includes:
+                            next_level.add(header)
+            level = sorted(next_level)
+        return headers
+
+    def _parse(self, files):
+        """returns list of includes of each file in order of files"""
+
+        files = list(files)
+        results = [None] * len(files)
+        todo = []
+        for i, file_path in enumerate(files):
+            key = self._memo_key(file_path)
+            if key in self._memo:
+                results[i] = self._memo[key]
+            else:
+                todo.append(i)
+        paths = [files[i] for i in todo]
+        parsed = process_map(parse_includes, paths, self.jobs)
+        for i, found in zip(todo, parsed):
+            results[i] = found
+            key = self._memo_key(files[i])
+            if key:
+                self._memo[key] = found
+        return results
+
+    @staticmethod
+    def _memo_key(file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (file_path, stat.st_size, stat.st_mtime_ns)
+
+    def _resolve(self, name, quoted, current_dir):
+        key = (current_dir if quoted else None, name)
+        if key not in self._resolved:
+            dirs = self.include_dirs
+            if quoted:
+                dirs = [current_dir] + dirs
+            self._resolved[key] = next(
+                (path.realpath(path.join(d, name)) for d in dirs
+                 if path.isfile(path.join(d, name))), None)
+        return self._resolved[key]
+
+
+def parse_includes(file_path):
+    """returns list of (header name, quoted) tuples of #include directives
+       in file that are not in #if 0 blocks"""
+
+    try:
+        with open(file_path, "rb") as source:
+            data = source.read()
+    except OSError:
+        return []
+    if b"include" not in data:
+        return []
+    text = data.decode("latin-1").replace("\\\n", "")
+    text = _comment_re.sub(
+        lambda m: m.group(0) if m.group(0)[0] in "\"'"
+        else " " + "\n" * m.group(0).count("\n"), text)
+    includes = []
+    # states of nested conditional blocks, branches of blocks with
+    # unknown condition are all scanned
+    stack = []
+    for directive, rest in _directive_re.findall(text):
+        if directive in ("if", "ifdef", "ifndef"):
+            condition = rest.strip() if directive == "if" else None
+            stack.append(_if_states.get(condition, "unknown"))
+        elif directive in ("else", "elif"):
+            if stack:
+                stack[-1] = _else_states[directive][stack[-1]]
+        elif directive == "endif":
+            if stack:
+                stack.pop()
+        elif directive in ("include", "include_next") and \
+                "skip" not in stack and "done" not in stack:
+            match = _include_re.match(rest)
+            if match:
+                includes.append((match.group(1) or match.group(2),
+                                 bool(match.group(2))))
+    return includes
@@ -1,17 +1,101 @@
 from rpg.plugin import Plugin
-from modulefinder import ModuleFinder
+from rpg.file_index import FileIndex
+from rpg.utils import process_map
+from importlib import util
+from os import path
+import ast
+import logging
+import sys
+import sysconfig
 
 
 class PythonPlugin(Plugin):
 
+    reads = ["Requires"]
+    writes = ["Requires"]
+    version = 2
+
+    # worker processes parsing files, see rpg.utils.process_map
+    jobs = None
+
     def patched(self, project_dir, spec, sack):
-            files = list(project_dir.glob('*.py'))
-            files.extend(list(project_dir.glob('*/*.py')))
+        files = []
+        project_modules = set()
+        for entry in FileIndex.of(project_dir).glob("**/*.py"):
+            if entry.is_file():
+                files.append(str(entry.path))
+                project_modules.add(entry.name[:-3])
+                if entry.name == "__init__.py":
+                    project_modules.add(path.basename(
+                        path.dirname(str(entry.path))))
+
+        imports = process_map(module_imports, files, self.jobs)
+
+        modules = set().union(*imports) - project_modules
+        distributions = _packages_distributions()
+        for module in sorted(modules):
+            if _is_stdlib(module):
+                continue
+            for dist in distributions.get(module, [module]):
+                require = "python3dist(%s)" % _canonical_name(dist)
+                if require not in spec.Requires:
+                    spec.Requires.append(require)
+
+
+def module_imports(file_path):
+    """returns set of top level names of modules imported by python file"""
+
+    try:
+        with open(file_path, "rb") as source:
+            tree = ast.parse(source.read(), file_path)
+    except (SyntaxError, ValueError, OSError) as err:
+        logging.warn("can't parse %s: %s" % (file_path, err))
+        return set()
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            imports.add(node.module.split(".")[0])
+    return imports
+
+
+def _is_stdlib(module):
+    if module in sys.builtin_module_names:
+        return True
+    if hasattr(sys, "stdlib_module_names"):
+        return module in sys.stdlib_module_names
+    # python < 3.10, module is found without importing it
+    try:
+        spec = util.find_spec(module)
+    except (ImportError, ValueError):
+        return False
+    if spec is None:
+        return False
+    if spec.origin in ("built-in", "frozen"):
+        return True
+    origin = spec.origin or next(iter(spec.submodule_search_locations or
+                                      []), None)
+    if not origin:
+        return False
+    origin = path.realpath(origin)
+    stdlib_dirs = set(path.realpath(sysconfig.get_paths()[name])
+                      for name in ("stdlib", "platstdlib"))
+    return any(origin.startswith(stdlib_dir + path.sep)
+               for stdlib_dir in stdlib_dirs) and \
+        "site-packages" not in origin and "dist-packages" not in origin
+
+
+def _packages_distributions():
+    """returns dict top level module -> list of distributions providing
+       it for installed distributions"""
+
+    try:
+        from importlib.metadata import packages_distributions
+    except ImportError:
+        return {}
+    return packages_distributions()
 
-            mod = ModuleFinder()
-            for item in files:
-                mod.run_script(str(item))
 
-            for name, mod in mod.modules.items():
-                if mod.__file__:
-                    spec.Requires.append(mod.__file__)
+def _canonical_name(dist):
+    return dist.lower().replace("_", "-").replace(".", "-")
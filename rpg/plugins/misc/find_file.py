@@ -1,14 +1,17 @@
 from rpg.plugin import Plugin
+from rpg.file_index import FileIndex
 
 
 class FindFilePlugin(Plugin):
 
+    reads = []
+    writes = ["files"]
+
     def installed(self, project_dir, spec, sack):
         self.files = []
-        for item in list(project_dir.glob('**/*')):
-            if (item.is_file() and '__pycache__' not in str(item)):
-                self.files.append(("/" + str(item.relative_to(project_dir)),
-                                   None, None))
+        for item in FileIndex.of(project_dir).files():
+            if '__pycache__' not in item.relpath:
+                self.files.append(("/" + item.relpath, None, None))
         sorted_files = sorted(self.files, key=lambda e: e[0])
         for one_file in sorted_files:
             spec.files.append(one_file)
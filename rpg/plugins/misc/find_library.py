@@ -1,11 +1,16 @@
 from rpg.plugin import Plugin
+from rpg.file_index import FileIndex
 
 
 class FindLibraryPlugin(Plugin):
 
+    reads = []
+    writes = ["post", "postun"]
+
     def installed(self, project_dir, spec, sack):
-        dyn_libs = list(project_dir.glob('**/lib*.so*'))
-        static_libs = list(project_dir.glob('**/lib*.a*'))
+        index = FileIndex.of(project_dir)
+        dyn_libs = index.glob('**/lib*.so*')
+        static_libs = index.glob('**/lib*.a*')
         if ((dyn_libs and dyn_libs[0].is_file()) or
            static_libs and static_libs[0].is_file()):
 
@@ -1,19 +1,27 @@
 from rpg.plugin import Plugin
-import subprocess
+from rpg.file_classifier import FileClassifier
+from rpg.file_index import FileIndex
+import os
+
+# directories searched recursively for patches besides project root
+PATCH_DIRS = ["patches", "debian/patches"]
 
 
 class FindPatchPlugin(Plugin):
 
+    reads = []
+    writes = ["Patch"]
+    version = 2
+
     def extracted(self, project_dir, spec, sack):
-        patches = [(f, f.stat().st_mtime) for f in project_dir.iterdir()
-                   if _is_patch(f)]
+        index = FileIndex.of(project_dir)
+        candidates = index.glob("*")
+        for patch_dir in PATCH_DIRS:
+            candidates += index.glob(patch_dir + "/**/*")
+        entries = dict((str(project_dir / entry.relpath), entry)
+                       for entry in candidates if entry.is_file())
+        patches = [(path, os.stat(path).st_mtime)
+                   for path in FileClassifier().is_patch(sorted(entries))]
         patches_by_modification = sorted(patches, key=lambda m: m[1])
         spec.Patch = list(
             map(lambda p: str(p[0]), patches_by_modification))
-
-
-def _is_patch(path):
-    if path.is_dir():
-        return False
-    output = subprocess.check_output(["file", str(path), "-b"])
-    return output.decode().find("unified diff output") != -1
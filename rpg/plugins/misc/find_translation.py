@@ -1,10 +1,14 @@
 from rpg.plugin import Plugin
+from rpg.file_index import FileIndex
 
 
 class FindTranslationPlugin(Plugin):
 
+    reads = []
+    writes = ["files"]
+
     def installed(self, project_dir, spec, sack):
-        translation_file = list(project_dir.glob('**/*.mo'))
+        translation_file = FileIndex.of(project_dir).glob('**/*.mo')
         if translation_file and translation_file[0].is_file():
             spec.files.insert(0, (("-f %%{%s}.lang"
                                    % translation_file[0].name), None, None))
@@ -5,6 +5,11 @@ import logging
 
 class CMakePlugin(Plugin):
 
+    reads = []
+    writes = ["BuildRequires", "build", "install"]
+    # CMakeLists.txt is preferred to (possibly generated) Makefile
+    after = ["MakePlugin"]
+
     def patched(self, project_dir, spec, sack):
         if (project_dir / "CMakeLists.txt").is_file():
             spec.BuildRequires.append("cmake")
@@ -5,6 +5,9 @@ import logging
 
 class MakePlugin(Plugin):
 
+    reads = []
+    writes = ["BuildRequires", "build", "install"]
+
     def patched(self, project_dir, spec, sack):
         if (project_dir / "Makefile").is_file():
             spec.BuildRequires.append("make")
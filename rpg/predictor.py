@@ -0,0 +1,59 @@
+from bisect import bisect_left
+from heapq import nsmallest
+
+# prefixes up to this length have their best completions precomputed,
+# they match too many words to rank them on every lookup
+_PRECOMPUTED_PREFIX = 2
+_PRECOMPUTED_LIMIT = 100
+
+
+class Predictor:
+
+    """Sorted array of words for ranked prefix lookups used by
+       autocompletion. ranks is optional dict word -> weight (e.g. number
+       of packages providing the word), words with higher weight are
+       offered first."""
+
+    def __init__(self, words, ranks=None):
+        self.words = sorted(set(words))
+        self._ranks = ranks or {}
+        self._top = {}
+        for word in self.words:
+            for length in range(1, min(len(word), _PRECOMPUTED_PREFIX) + 1):
+                self._top.setdefault(word[:length], []).append(word)
+        for prefix, words in self._top.items():
+            self._top[prefix] = nsmallest(_PRECOMPUTED_LIMIT, words,
+                                          key=self._rank_key)
+
+    def __len__(self):
+        return len(self.words)
+
+    def _rank_key(self, word):
+        return (-self._ranks.get(word, 0), len(word), word)
+
+    def _contains(self, word):
+        i = bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i] == word
+
+    def complete(self, prefix, limit=None):
+        """returns words starting with prefix ordered by their rank,
+           exact match is always the first one"""
+
+        if not prefix:
+            candidates = self.words
+        elif len(prefix) <= _PRECOMPUTED_PREFIX and \
+                (limit is not None and limit <= _PRECOMPUTED_LIMIT):
+            candidates = self._top.get(prefix, [])
+        else:
+            start = bisect_left(self.words, prefix)
+            end = bisect_left(self.words, prefix + "\U0010ffff", start)
+            candidates = self.words[start:end]
+        if limit is None:
+            ranked = sorted(candidates, key=self._rank_key)
+        else:
+            ranked = nsmallest(limit, candidates, key=self._rank_key)
+        if prefix and self._contains(prefix):
+            if prefix in ranked:
+                ranked.remove(prefix)
+            ranked.insert(0, prefix)
+        return ranked if limit is None else ranked[:limit]
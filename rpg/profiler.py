@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+import cProfile
+import json
+import logging
+import resource
+import time
+
+
+class Profiler:
+
+    """Collects wall time, CPU time and memory growth of plugins in every
+       phase (with spec fields they changed) and of Base steps. CPU time
+       includes terminated child processes (make, process pools), memory
+       is growth of peak RSS of process, so it's 0 for steps that stay
+       below the peak reached before. If
+       cprofile_dir (pathlib.Path) is set, every plugin is run under
+       cProfile and its stats are saved there as <phase>-<plugin>.prof."""
+
+    def __init__(self, cprofile_dir=None):
+        self.cprofile_dir = cprofile_dir
+        self.records = []
+        self._lock = Lock()
+
+    def add(self, phase, name, record, fields=()):
+        """stores record returned by run_measured"""
+
+        record = dict(record, phase=phase, name=name, fields=sorted(fields))
+        with self._lock:
+            self.records.append(record)
+
+    def cprofile_path(self, phase, name):
+        if not self.cprofile_dir:
+            return None
+        return str(self.cprofile_dir / ("%s-%s.prof" % (phase, name)))
+
+    @contextmanager
+    def step(self, name):
+        """measures block of code as step of Base"""
+
+        start = _measure_start()
+        try:
+            yield
+        finally:
+            self.add("base", name, _measure_end(start))
+
+    def to_json(self):
+        return json.dumps(self.records, indent=2, sort_keys=True)
+
+    def table(self):
+        """returns report as text table, the slowest entries first"""
+
+        lines = ["%-10s %-28s %9s %9s %10s  %s" % (
+            "phase", "name", "wall [s]", "cpu [s]", "mem [KiB]", "fields")]
+        for record in sorted(self.records, key=lambda r: -r["wall"]):
+            lines.append("%-10s %-28s %9.3f %9.3f %10d  %s" % (
+                record["phase"], record["name"], record["wall"],
+                record["cpu"], record["memory"], ", ".join(record["fields"])))
+        return "\n".join(lines)
+
+    def save(self, path):
+        """writes JSON report to path and logs the table"""
+
+        path = Path(str(path))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), "w") as report:
+            report.write(self.to_json())
+        logging.info("profile saved to %s:\n%s" % (str(path), self.table()))
+
+
+def run_measured(func, args, cprofile_path=None):
+    """calls func(*args) and returns its result with dict of wall and CPU
+       time in seconds and growth of peak memory of process in KiB. CPU
+       time is time of calling thread and of child processes that
+       finished meanwhile (children of plugins running in parallel can be
+       counted to any of them). Works in worker processes as well,
+       cProfile stats are written to cprofile_path if given."""
+
+    start = _measure_start()
+    if cprofile_path:
+        profile = cProfile.Profile()
+        try:
+            result = profile.runcall(func, *args)
+        finally:
+            Path(cprofile_path).parent.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(cprofile_path)
+    else:
+        result = func(*args)
+    return result, _measure_end(start)
+
+
+def _measure_start():
+    return (time.monotonic(), time.thread_time() + _children_cpu(),
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _measure_end(start):
+    wall, cpu, rss = start
+    return {"wall": time.monotonic() - wall,
+            "cpu": time.thread_time() + _children_cpu() - cpu,
+            "memory": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss -
+            rss}
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
@@ -1,28 +1,58 @@
-from shutil import copytree, rmtree
+from shutil import rmtree
+from rpg.utils import sync_tree
+from rpg.plugin_engine import Cancelled
+from pathlib import Path
 import logging
 
 
 class ProjectBuilder:
 
-    def build(self, project_source_dir, project_target_dir, build_command):
+    def __init__(self):
+        # target dir -> relative paths of files synced from sources
+        self._synced = {}
+
+    def build(self, project_source_dir, project_target_dir, build_command,
+              incremental=False, cancel_event=None):
         """Builds project in given project_target_dir then cleans this
            directory, build_params is list of command strings.
+           If incremental is True and project was already built to
+           project_target_dir, only changed sources are copied and previous
+           build outputs are kept. Build is killed and Cancelled is raised
+           when cancel_event (threading.Event) is set.
            returns list of files that should be installed or error string"""
         logging.debug('build(%s, %s, %s)' % (repr(project_source_dir),
                       repr(project_target_dir), repr(build_command)))
         project_source_dir = str(project_source_dir)
+        target_dir = str(project_target_dir)
+
+        if incremental and target_dir in self._synced:
+            previous = self._synced[target_dir]
+        else:
+            try:
+                rmtree(target_dir)
+            except FileNotFoundError:
+                pass
+            previous = ()
+        # project is built in place, so files can't be hardlinked
+        self._synced[target_dir] = sync_tree(project_source_dir, target_dir,
+                                             previous)
 
-        rmtree(str(project_target_dir))
-        copytree(project_source_dir, str(project_target_dir))
+        _run(build_command, project_target_dir, target_dir + ".log",
+             cancel_event)
 
-        build_command.execute_from(project_target_dir)
+    def forget(self, project_target_dir):
+        """next build to project_target_dir copies all sources again, has
+           to be called when the directory is removed"""
+        self._synced.pop(str(project_target_dir), None)
 
-    def install(self, project_source_dir, project_target_dir, install_command):
+    def install(self, project_source_dir, project_target_dir, install_command,
+                cancel_event=None):
         logging.debug('install(%s, %s, %s)' % (repr(project_source_dir),
                       repr(project_target_dir), repr(install_command)))
         install_command.rpm_variables.append(("RPM_BUILD_ROOT",
                                               project_target_dir))
-        install_command.execute_from(project_source_dir)
+        _run(install_command, project_source_dir,
+             str(project_target_dir) + ".log", cancel_event)
 
     def _apply_patch(self, patch):
         return False
@@ -33,3 +63,17 @@ class ProjectBuilder:
         for patch in ordered_patches:
             if not self._apply_patch(patch):
                 return patch
+
+
+def _run(command, work_dir, log_file, cancel_event=None):
+    """executes command with stdout streamed to log_file, failure is logged
+       with its stderr and raises CalledProcessError"""
+    result = command.run_from(Path(str(work_dir)), log_file, cancel_event)
+    if result.cancelled:
+        logging.info("cancelled: %s" % " && ".join(result.cmdlines))
+        raise Cancelled()
+    logging.info("%s, output in %s" % (str(result), log_file))
+    if result.returncode:
+        logging.error("command failed:\n%s"
+                      % result.stderr.decode("utf-8", "replace"))
+    result.check()
@@ -0,0 +1,191 @@
+from glob import glob
+from hashlib import sha1
+from rpg.checksum import file_digest
+from rpg.utils import atomic_write
+from threading import Lock, Thread
+import logging
+import os
+import sqlite3
+
+# version of database layout, index is rebuilt when it changes
+SCHEMA_VERSION = "1"
+
+_schema = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE packages (id INTEGER PRIMARY KEY, name TEXT, license TEXT);
+CREATE TABLE provides (name TEXT, package INTEGER);
+CREATE TABLE files (path TEXT, package INTEGER);
+"""
+
+_indexes = """
+CREATE INDEX packages_name ON packages (name);
+CREATE INDEX provides_name ON provides (name);
+CREATE INDEX files_path ON files (path);
+"""
+
+
+class SackIndex:
+
+    """Snapshot of the data rpg uses from DNF sack - package names,
+       provides, licenses and file owners. It is stored in indexed sqlite
+       database (path is pathlib.Path) that is memory mapped when opened and
+       is valid while checksum of repository metadata stays the same."""
+
+    def __init__(self, path):
+        self.path = path
+        self.checksum = None
+        self._db = None
+        self._lock = Lock()
+
+    @staticmethod
+    def repos_checksum(dnf_base):
+        """returns checksum of metadata of enabled repositories downloaded
+           by DNF or None if some of them is not in DNF cache"""
+
+        parts = [str(dnf_base.conf.releasever), SCHEMA_VERSION]
+        for repo in sorted(dnf_base.repos.iter_enabled(), key=lambda r: r.id):
+            repomd = sorted(glob(os.path.join(
+                dnf_base.conf.cachedir, repo.id + "-*", "repodata",
+                "repomd.xml")))
+            if not repomd:
+                return None
+            parts += [repo.id] + [file_digest(path) for path in repomd]
+        return sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def open(self, checksum):
+        """opens existing index, returns False if there is no index
+           for checksum"""
+
+        if not checksum or not self.path.exists():
+            return False
+        try:
+            db = sqlite3.connect("file:%s?mode=ro" % str(self.path), uri=True,
+                                 check_same_thread=False)
+            db.execute("PRAGMA mmap_size = %d" % 2 ** 30)
+            stored = db.execute(
+                "SELECT value FROM meta WHERE key = 'checksum'").fetchone()
+        except sqlite3.Error as err:
+            logging.warn("can't open DNF sack index %s: %s"
+                         % (str(self.path), err))
+            return False
+        if not stored or stored[0] != checksum:
+            db.close()
+            return False
+        self._set_db(db, checksum)
+        return True
+
+    def build(self, sack, checksum):
+        """stores data of all packages in sack, new index replaces old one
+           atomically and is opened"""
+
+        if not checksum:
+            return
+        logging.info("building DNF sack index %s" % str(self.path))
+        # sqlite creates the database in the empty temporary file
+        with atomic_write(self.path) as tmp:
+            db = sqlite3.connect(tmp.name)
+            try:
+                db.execute("PRAGMA journal_mode = OFF")
+                db.execute("PRAGMA synchronous = OFF")
+                db.executescript(_schema)
+                for i, pkg in enumerate(sack.query()):
+                    db.execute("INSERT INTO packages VALUES (?, ?, ?)",
+                               (i, pkg.name, pkg.license or ""))
+                    db.executemany("INSERT INTO provides VALUES (?, ?)",
+                                   ((str(provide), i)
+                                    for provide in pkg.provides))
+                    db.executemany("INSERT INTO files VALUES (?, ?)",
+                                   ((path, i) for path in pkg.files))
+                db.executescript(_indexes)
+                db.execute("INSERT INTO meta VALUES ('checksum', ?)",
+                           (checksum,))
+                db.commit()
+            finally:
+                db.close()
+        self.open(checksum)
+
+    def _set_db(self, db, checksum):
+        with self._lock:
+            if self._db:
+                self._db.close()
+            self._db = db
+            self.checksum = checksum
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def names(self, counts=False):
+        """returns sorted list of package names, or list of (name, number
+           of packages) tuples if counts is True"""
+
+        return self._counted("SELECT name, COUNT(*) FROM packages "
+                             "GROUP BY name ORDER BY name", counts)
+
+    def provides(self, counts=False):
+        """returns sorted list of provides, see names"""
+
+        return self._counted("SELECT name, COUNT(*) FROM provides "
+                             "GROUP BY name ORDER BY name", counts)
+
+    def licenses(self, counts=False):
+        """returns sorted list of licenses, see names"""
+
+        return self._counted("SELECT license, COUNT(*) FROM packages "
+                             "WHERE license != '' GROUP BY license "
+                             "ORDER BY license", counts)
+
+    def owners(self, paths):
+        """returns dict path -> name of package owning it for all paths
+           found in index, paths are resolved in single indexed join"""
+
+        with self._lock:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS lookup "
+                             "(path TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM lookup")
+            self._db.executemany("INSERT OR IGNORE INTO lookup VALUES (?)",
+                                 ((path,) for path in paths))
+            rows = self._db.execute(
+                "SELECT lookup.path, MIN(packages.name) FROM lookup "
+                "JOIN files ON files.path = lookup.path "
+                "JOIN packages ON packages.id = files.package "
+                "GROUP BY lookup.path").fetchall()
+            self._db.execute("DELETE FROM lookup")
+        return dict(rows)
+
+    def _counted(self, sql, counts):
+        rows = self._query(sql)
+        return rows if counts else [row[0] for row in rows]
+
+
+class LazySack:
+
+    """Proxy of DNF sack that is filled in background thread by load
+       callable. Only code that really uses the sack waits for it."""
+
+    def __init__(self, load):
+        self._sack = None
+        self._error = None
+        self._thread = Thread(target=self._load, args=(load,), daemon=True)
+        self._thread.start()
+
+    def _load(self, load):
+        try:
+            self._sack = load()
+        except Exception as err:
+            self._error = err
+
+    @property
+    def loaded(self):
+        return not self._thread.is_alive()
+
+    def wait(self):
+        """returns loaded sack"""
+
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self._sack
+
+    def __getattr__(self, name):
+        return getattr(self.wait(), name)
@@ -1,15 +1,26 @@
 import logging
 from os.path import isfile
 from os.path import isdir
+from os.path import basename, join, normpath
 import re
 from rpg.command import Command
+from rpg.extractor import Extractor
+from rpg.utils import copy_tree
 from pathlib import Path
 
 
 class SourceLoader(object):
 
-    def __init__(self):
+    # how directories are imported - "auto" (copy-on-write reflinks where
+    # filesystem supports them, copies elsewhere) or "copy"
+    import_mode = "auto"
+
+    def __init__(self, progress=None):
+        """progress is optional callable reporting extraction progress,
+           see rpg.extractor.Extractor"""
+
         self.prep = Command()
+        self._extractor = Extractor(progress)
 
     def extract(self, arch, extract, compr):
         """ Extracts files from archive """
@@ -17,7 +28,9 @@ class SourceLoader(object):
         prep = Command()
         if compr[0] == "tar":
             tar_compr = ""
-            if compr[1] == "xz":
+            if not compr[1]:
+                pass
+            elif compr[1] == "xz":
                 tar_compr = "J"
             elif compr[1] == "gz":
                 tar_compr = "z"
@@ -47,7 +60,10 @@ class SourceLoader(object):
         else:
             raise SystemExit("Internal error: Unknown compression \
                 method: " + compr[0] + "." + compr[1])
-        prep.execute()
+        if self._extractor.supports(compr):
+            self._extractor.extract(arch, extract, compr)
+        else:
+            prep.execute()
         self.prep.append(str(prep))
 
     def copy_dir(self, path, ex_dir):
@@ -55,7 +71,8 @@ class SourceLoader(object):
             prep macro """
 
         prep = Command("cp -rf " + path + " " + ex_dir)
-        prep.execute()
+        copy_tree(path, join(ex_dir, basename(normpath(path))),
+                  reflinks=self.import_mode != "copy")
         self.prep.append(str(prep))
 
     def process(self, ext_dir):
@@ -1,4 +1,5 @@
 from rpg.command import Command
+from copy import deepcopy
 
 
 class Subpackage(dict):
@@ -67,6 +68,10 @@ class Subpackage(dict):
                 "changelog": Command()
                 }
         dict.__init__(self, tags)
+        # every instance needs its own lists, otherwise all specs
+        # (including working copies of plugins) would share them
+        self.__dict__["files"] = []
+        self.__dict__["files_translations"] = []
 
     def __getattr__(self, key):
         ''' Returns attribute of chosen key from dict '''
@@ -182,6 +187,8 @@ class Spec(Subpackage):
 
     def __init__(self):
         super(Spec, self).__init__()
+        self.__dict__["subpackages"] = []
+        self.__dict__["changelogs"] = []
 
     def __str__(self):
         tags = self._get_tags()
@@ -273,3 +280,78 @@ class Spec(Subpackage):
                 self.author,
                 self.email,
                 msg)
+
+
+class SpecDelta:
+
+    """Changes made to Spec by plugin(s). Delta is computed from snapshot
+       taken before and Spec state after plugin execution and can be applied
+       to another Spec instance later. Lists that were only extended
+       remember just added items, so deltas of independent plugins
+       can be merged together in the same way as if plugins were executed
+       one after another."""
+
+    # attributes of Spec that are not stored in dict
+    _attributes = ["files", "files_translations"]
+
+    def __init__(self, before, after):
+        self.changes = {}
+        before = self._state(before)
+        for key, value in self._state(after).items():
+            old_value = before.get(key)
+            if old_value == value:
+                continue
+            self.changes[key] = _diff(old_value, value)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __repr__(self):
+        return "SpecDelta(%s)" % repr(self.changes)
+
+    @property
+    def keys(self):
+        return sorted(self.changes.keys())
+
+    @staticmethod
+    def snapshot(spec):
+        """returns independent working copy of spec"""
+
+        return deepcopy(spec)
+
+    @classmethod
+    def _state(cls, spec):
+        state = dict(spec)
+        for attr in cls._attributes:
+            state[attr] = getattr(spec, attr)
+        return state
+
+    def apply(self, spec):
+        """replays recorded changes on spec"""
+
+        for key, (kind, head, tail) in self.changes.items():
+            current = getattr(spec, key) if key in self._attributes \
+                else spec[key]
+            if kind == "set":
+                value = deepcopy(head)
+            elif isinstance(current, list):
+                current[:] = deepcopy(head) + current + deepcopy(tail)
+                continue
+            else:
+                value = deepcopy(head + tail)
+            if key in self._attributes:
+                getattr(spec, key)[:] = value
+            else:
+                spec[key] = value
+
+
+def _diff(old_value, new_value):
+    """returns ("extend", head, tail) if new_value is list old_value
+       surrounded by lists head and tail, ("set", new_value, None) otherwise"""
+
+    if isinstance(old_value, list) and isinstance(new_value, list):
+        for i in range(len(new_value) - len(old_value) + 1):
+            if new_value[i:i + len(old_value)] == old_value:
+                return ("extend", deepcopy(new_value[:i]),
+                        deepcopy(new_value[i + len(old_value):]))
+    return ("set", deepcopy(new_value), None)
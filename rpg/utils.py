@@ -1,5 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from subprocess import call
+from tempfile import NamedTemporaryFile
 import ctypes
+import errno
+import fcntl
+import logging
+import os
+import shutil
+
+# ioctl request sharing extents of one file with another (linux/fs.h)
+FICLONE = 0x40049409
+
+# items are processed by process_map in worker processes only when there
+# is enough of them
+PARALLEL_THRESHOLD = 64
+
+# errors meaning that the filesystem doesn't support the operation
+_unsupported = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                errno.EPERM, errno.EMLINK, errno.ENOSYS)
 
 
 def copy_file(location, target):
@@ -8,3 +27,150 @@ def copy_file(location, target):
 
 def get_architecture():
     return 8 * ctypes.sizeof(ctypes.c_voidp)
+
+
+def process_map(func, items, jobs=None):
+    """returns list of func(item) for items, they are processed in jobs
+       worker processes (number of CPUs if None) when there is at least
+       PARALLEL_THRESHOLD of them and jobs isn't 1"""
+
+    items = list(items)
+    if len(items) < PARALLEL_THRESHOLD or jobs == 1:
+        return [func(item) for item in items]
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(func, items, chunksize=32))
+
+
+@contextmanager
+def atomic_write(path, mode="wb"):
+    """opens temporary file next to path (pathlib.Path) that replaces path
+       when the with block finishes, so readers (e.g. concurrent rpg
+       processes) never see partially written file. Temporary file is
+       removed if the block raises."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(mode, dir=str(path.parent), delete=False,
+                            prefix=".tmp-") as tmp:
+        try:
+            yield tmp
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, str(path))
+
+
+def reflink(source, target):
+    """creates copy-on-write clone of source file, raises OSError if
+       filesystem doesn't support it"""
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
+    shutil.copystat(source, target)
+
+
+def copy_tree(source, target, reflinks=True):
+    """copies directory tree source into target directory. Files are
+       cloned by reflinks if filesystem supports it and copied otherwise,
+       so writes to target never change source (hardlinks aren't used
+       for that reason). Symlinks are copied as symlinks. Returns list of
+       used methods names."""
+
+    methods = []
+    if reflinks:
+        methods.append(reflink)
+    methods.append(shutil.copy2)
+    used = set()
+    _copy_tree(str(source), str(target), methods, used)
+    logging.debug("%s imported to %s by %s" % (source, target,
+                                               ", ".join(sorted(used))))
+    return sorted(used)
+
+
+def sync_tree(source, target, previous=()):
+    """makes target directory tree up to date with source. Only files which
+       size or modification time differ are copied (reflinked if possible),
+       files of previous sync that don't exist in source anymore are
+       removed, other files in target (e.g. build outputs) are kept.
+       Returns set of relative paths of synced files."""
+
+    synced = set()
+    _sync_tree(str(source), str(target), "", [reflink, shutil.copy2], synced)
+    for relative in set(previous) - synced:
+        path = os.path.join(str(target), relative)
+        if os.path.islink(path) or os.path.isfile(path):
+            os.unlink(path)
+    return synced
+
+
+def _sync_tree(source, target, relative, methods, synced):
+    os.makedirs(target, exist_ok=True)
+    with os.scandir(source) as entries:
+        for entry in entries:
+            dest = os.path.join(target, entry.name)
+            rel = os.path.join(relative, entry.name)
+            try:
+                dest_stat = os.lstat(dest)
+            except FileNotFoundError:
+                dest_stat = None
+            if entry.is_symlink():
+                link = os.readlink(entry.path)
+                if dest_stat is None or not os.path.islink(dest) or \
+                   os.readlink(dest) != link:
+                    _remove(dest, dest_stat)
+                    os.symlink(link, dest)
+                synced.add(rel)
+            elif entry.is_dir():
+                if dest_stat is not None and not os.path.isdir(dest):
+                    _remove(dest, dest_stat)
+                _sync_tree(entry.path, dest, rel, methods, synced)
+            else:
+                stat = entry.stat()
+                if dest_stat is None or os.path.islink(dest) or \
+                   dest_stat.st_size != stat.st_size or \
+                   dest_stat.st_mtime_ns != stat.st_mtime_ns:
+                    # never write through file which could share data
+                    _remove(dest, dest_stat)
+                    _copy_file(entry.path, dest, methods, set())
+                synced.add(rel)
+
+
+def _remove(path, stat):
+    if stat is None:
+        return
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def _copy_tree(source, target, methods, used):
+    os.makedirs(target, exist_ok=True)
+    with os.scandir(source) as entries:
+        for entry in entries:
+            dest = os.path.join(target, entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), dest)
+            elif entry.is_dir():
+                _copy_tree(entry.path, dest, methods, used)
+            else:
+                _copy_file(entry.path, dest, methods, used)
+    shutil.copystat(source, target)
+
+
+def _copy_file(source, target, methods, used):
+    for method in list(methods):
+        try:
+            method(source, target)
+            used.add(method.__name__)
+            return
+        except OSError as err:
+            if method is methods[-1] or err.errno not in _unsupported:
+                raise
+            # don't try unsupported method for the rest of the tree
+            methods.remove(method)
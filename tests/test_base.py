@@ -1,5 +1,11 @@
 from support import RpgTestCase
 from rpg import Base
+from rpg.command import Command
+from rpg.plugins.lang.c import CPlugin
+from unittest import mock
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
 import re
 
 
@@ -22,3 +28,87 @@ class BaseTest(RpgTestCase):
         self.base.process_archive_or_dir(self.test_project_dir / "c")
         self.assertTrue(re.match(r"^\/tmp\/rpg-c-[0-9a-fA-F]+$",
                                  str(self.base.base_dir)))
+
+    def test_speculative_build(self):
+        self.base._hash = "0000000"
+        self.base._source_digest = "0" * 40
+        self.base._input_name = "test"
+        self.base._project_builder = mock.MagicMock()
+        self.base.spec.build = Command("make")
+        self.base.speculate_build()
+        self.base.build_project()
+        self.base.install_project()
+        self.assertEqual(1, self.base._project_builder.build.call_count)
+        self.assertEqual(1, self.base._project_builder.install.call_count)
+
+        # changed script restarts the build
+        self.base.speculate_build()
+        self.base.spec.build = Command("make all")
+        self.base.build_project()
+        builds = self.base._project_builder.build.call_args_list
+        self.assertEqual(3, len(builds))
+        self.assertEqual(Command("make all"), builds[-1][0][2])
+        self.assertIsNone(self.base._speculative_build)
+
+    def test_speculative_build_survives_cancel(self):
+        self.base._hash = "0000000"
+        self.base._source_digest = "0" * 40
+        self.base._input_name = "test"
+        self.base._project_builder = mock.MagicMock()
+        self.base.spec.build = Command("make")
+        self.base.speculate_build()
+        # cancel of unrelated background task
+        self.base.cancel()
+        self.base.reset_cancel()
+        self.base.build_project()
+        self.base.install_project()
+        self.assertEqual(1, self.base._project_builder.build.call_count)
+        self.assertFalse(
+            self.base._project_builder.build.call_args[0][4].is_set())
+
+    def test_speculative_build_disabled(self):
+        self.base.conf.speculative_build = False
+        self.base.spec.build = Command("make")
+        self.base.speculate_build()
+        self.assertIsNone(self.base._speculative_build)
+
+    def test_reused_workspace(self):
+        self.base._analysis_cache = mock.MagicMock()
+        self.base.process_archive_or_dir(self.test_project_dir / "c")
+        self.assertEqual(40, len(self.base._source_digest))
+        stale = [self.base.installed_dir / "stale",
+                 self.base.base_dir / "c.spec",
+                 self.base.base_dir / "c-1-1.src.rpm",
+                 self.base.base_dir / "results"]
+        for path in stale:
+            path.touch()
+        (self.base.extracted_dir / "kept").touch()
+        self.base.process_archive_or_dir(self.test_project_dir / "c")
+        self.assertEqual([], [path for path in stale if path.exists()])
+        self.assertTrue((self.base.extracted_dir / "kept").exists())
+        self.assertTrue(self.base.compiled_dir.is_dir())
+
+    def test_resolve_headers(self):
+        tmp_dir = Path(mkdtemp(prefix="rpg_test_headers_"))
+        try:
+            include_dir = tmp_dir / "include"
+            (include_dir / "sys").mkdir(parents=True)
+            (include_dir / "sqlite3.h").write_text("")
+            (include_dir / "sys" / "types.h").write_text("")
+            (tmp_dir / "project").mkdir()
+            (tmp_dir / "project" / "main.c").write_text(
+                "#include <sqlite3.h>\n#include <sys/types.h>\n")
+            c_plug = CPlugin()
+            c_plug.system_include_dirs = [str(include_dir)]
+            c_plug.patched(tmp_dir / "project", self.base.spec, None)
+            self.base._path_resolver = mock.MagicMock()
+            self.base._path_resolver.resolve.return_value = {
+                str(include_dir / "sqlite3.h"): "sqlite-devel"}
+            with mock.patch("rpg.path_resolver.INCLUDE_DIRS",
+                            [str(include_dir)]):
+                self.base.resolve_requires()
+            expected = ["sqlite-devel", str(include_dir / "sys")]
+            self.assertEqual(expected, self.base.spec.Requires)
+            self.assertEqual(expected, self.base.spec.BuildRequires)
+        finally:
+            rmtree(str(tmp_dir))
@@ -0,0 +1,67 @@
+from support import RpgTestCase
+from rpg.batch import BatchRunner, _conf_values
+from rpg.conf import Conf
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree, copytree
+import json
+
+
+class BatchTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_batch_"))
+        self.conf = Conf()
+        self.conf.load_dnf = False
+        self.conf.use_cache = False
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_load_manifest(self):
+        manifest = self.tmp_dir / "manifest.json"
+        with open(str(manifest), "w") as f:
+            json.dump(["a.tar.gz", {"source": "b", "Version": "1.0"}], f)
+        self.assertEqual([{"source": "a.tar.gz"},
+                          {"source": "b", "Version": "1.0"}],
+                         BatchRunner.load_manifest(manifest))
+
+    def test_run(self):
+        runner = BatchRunner(self.conf, self.tmp_dir / "out", 2)
+        results = runner.run([
+            {"source": str(self.test_project_dir / "c"), "Version": "1.0"},
+            {"source": str(self.test_project_dir / "missing")}])
+        self.assertEqual([True, False], [r.success for r in results])
+        with open(results[0].spec) as spec:
+            content = spec.read()
+        self.assertIn("Name: c", content)
+        self.assertIn("Version: 1.0", content)
+        with open(str(self.tmp_dir / "out" / "summary.json")) as summary:
+            self.assertEqual(["ok", "failed"], [r["status"] for r in
+                                                json.load(summary)])
+        self.assertIn("2 sources, 1 failed", runner.report(results))
+
+    def test_colliding_names(self):
+        for name in ("a", "b"):
+            copytree(str(self.test_project_dir / "c"),
+                     str(self.tmp_dir / name / "proj"))
+            (self.tmp_dir / name / "proj" / name).touch()
+        self.conf.profile = "ignored.json"
+        runner = BatchRunner(self.conf, self.tmp_dir / "out", 2)
+        results = runner.run([{"source": str(self.tmp_dir / name / "proj"),
+                               "Version": "1.0"} for name in ("a", "b")])
+        self.assertEqual(["proj-1.0.spec", "proj-1.0-1.spec"],
+                         [Path(r.spec).name for r in results])
+        self.assertEqual(["proj-1.0.profile.json", "proj-1.0-1.profile.json"],
+                         [Path(r.profile).name for r in results])
+        self.assertTrue(all(Path(r.spec).exists() for r in results))
+        self.assertFalse((self.tmp_dir / "out" / ".work").exists())
+
+    def test_conf_values(self):
+        Conf.directories.append("/plugins")
+        try:
+            self.assertEqual(["/plugins"],
+                             _conf_values(self.conf)["directories"])
+            self.assertNotIn("parser", _conf_values(self.conf))
+        finally:
+            Conf.directories.remove("/plugins")
@@ -0,0 +1,61 @@
+from support import PluginTestCase
+from rpg import plugin_engine as engine
+from rpg.cache import AnalysisCache
+from rpg.plugin import Plugin
+from rpg.spec import Spec, SpecDelta
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+
+
+class CountingPlugin(Plugin):
+
+    executed = 0
+
+    def extracted(self, project_dir, spec, sack):
+        CountingPlugin.executed += 1
+        spec.Requires.append("counted")
+
+
+class CacheTest(PluginTestCase):
+
+    def setUp(self):
+        self.cache_dir = Path(mkdtemp(prefix="rpg_test_cache_"))
+        self.cache = AnalysisCache(self.cache_dir)
+        CountingPlugin.executed = 0
+
+    def tearDown(self):
+        rmtree(str(self.cache_dir))
+
+    def test_store_load(self):
+        before = Spec()
+        after = Spec()
+        after.Requires.append("python3")
+        key = self.cache.key("checksum", "extracted")
+        self.assertIsNone(self.cache.load(key))
+        self.cache.store(key, SpecDelta(before, after))
+        spec = Spec()
+        self.cache.load(key).apply(spec)
+        self.assertEqual(["python3"], spec.Requires)
+
+    def test_execute_phase_cached(self):
+        for i in range(2):
+            spec = Spec()
+            plugin_engine = engine.PluginEngine(spec, self.sack)
+            plugin_engine.plugins = {CountingPlugin()}
+            plugin_engine.cache = self.cache
+            plugin_engine.execute_phase(engine.phases[0],
+                                        self.test_project_dir, "checksum")
+            self.assertEqual(["counted"], spec.Requires)
+        self.assertEqual(1, CountingPlugin.executed)
+
+    def test_undeclared_reads_depend_on_spec(self):
+        for summary in ("first", "first", "second"):
+            spec = Spec()
+            spec.Summary = summary
+            plugin_engine = engine.PluginEngine(spec, self.sack)
+            plugin_engine.plugins = {CountingPlugin()}
+            plugin_engine.cache = self.cache
+            plugin_engine.execute_phase(engine.phases[0],
+                                        self.test_project_dir, "checksum")
+        self.assertEqual(2, CountingPlugin.executed)
@@ -0,0 +1,53 @@
+from support import RpgTestCase
+from rpg.checksum import StatCache, tree_checksum, file_digest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import mock
+from hashlib import sha1
+
+
+class ChecksumTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_checksum_"))
+        (self.tmp_dir / "dir with spaces").mkdir()
+        with open(str(self.tmp_dir / "dir with spaces" / "a file"), "w") as f:
+            f.write("content")
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_file_digest(self):
+        patch = self.test_project_dir / "patch" / "0.patch"
+        with open(str(patch), "rb") as f:
+            expected = sha1(f.read()).hexdigest()
+        self.assertEqual(expected, file_digest(str(patch)))
+        self.assertEqual(expected, tree_checksum(patch))
+
+    def test_tree_checksum(self):
+        checksum = tree_checksum(self.tmp_dir)
+        self.assertEqual(checksum, tree_checksum(self.tmp_dir))
+        with open(str(self.tmp_dir / "dir with spaces" / "a file"), "a") as f:
+            f.write("changed")
+        self.assertNotEqual(checksum, tree_checksum(self.tmp_dir))
+
+    def test_stat_cache(self):
+        cache_path = self.tmp_dir / "cache" / "stat_cache"
+        checksum = tree_checksum(self.tmp_dir / "dir with spaces",
+                                 StatCache(cache_path))
+        self.assertTrue(cache_path.exists())
+        with mock.patch("rpg.checksum.file_digest") as digest:
+            self.assertEqual(checksum, tree_checksum(
+                self.tmp_dir / "dir with spaces", StatCache(cache_path)))
+            self.assertFalse(digest.called)
+
+    def test_stat_cache_prune(self):
+        stat_cache = StatCache()
+        tree_checksum(self.tmp_dir, stat_cache)
+        (self.tmp_dir / "dir with spaces" / "a file").unlink()
+        with open(str(self.tmp_dir / "new"), "w") as f:
+            f.write("new")
+        tree_checksum(self.tmp_dir, stat_cache)
+        self.assertEqual([str(self.tmp_dir / "new")],
+                         [key[0] for key in stat_cache._digests])
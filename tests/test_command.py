@@ -1,7 +1,11 @@
 from pathlib import Path
 from support import RpgTestCase
-from rpg.command import Command
+from rpg.command import Command, ShellPool, use_shell_pool, cmd_run
+from unittest import mock
+from tempfile import NamedTemporaryFile
+from threading import Event, Timer
 import subprocess
+import time
 
 
 class PluginEngineTest(RpgTestCase):
@@ -25,11 +29,11 @@ class PluginEngineTest(RpgTestCase):
         cur_dir = Path('.')
         with self.assertRaises(subprocess.CalledProcessError) as ctx:
             cmd.execute_from(cur_dir)
-        expected = "Command '['/bin/sh', '-c', 'cd %s 2>/dev/null " \
-                   "&& pwd 2>/dev/null && cd c 2>/dev/null " \
-                   "&& pwd 2>/dev/null']' returned non-zero exit status 1"\
-                   % cur_dir.resolve()
-        self.assertEqual(expected, str(ctx.exception))
+        expected = ['/bin/sh', '-c', 'cd %s && pwd && cd c && pwd'
+                    % cur_dir.resolve()]
+        self.assertEqual(expected, ctx.exception.cmd)
+        self.assertNotEqual(0, ctx.exception.returncode)
+        self.assertIn(b"c", ctx.exception.stderr)
 
     def test_execute(self):
         cmd = Command("echo bla")
@@ -40,3 +44,80 @@ class PluginEngineTest(RpgTestCase):
         cmd1 = Command("test")
         cmd2 = Command("test")
         self.assertEqual(cmd1, cmd2)
+
+    def test_shell_pool(self):
+        pool = ShellPool(2)
+        try:
+            results = pool.run_batch([["cd /", "pwd"], ["echo err >&2",
+                                                        "false"],
+                                      ["X=1", "echo ${X}${Y}"]])
+            self.assertEqual([b"/\n", b"", b"1\n"],
+                             [result.stdout for result in results])
+            self.assertEqual(b"err\n", results[1].stderr)
+            self.assertEqual([0, 1, 0],
+                             [result.returncode for result in results])
+            # every command runs in its own subshell
+            self.assertNotEqual(b"/\n", pool.run(["pwd"]).stdout)
+            self.assertRaises(subprocess.CalledProcessError,
+                              results[1].check)
+        finally:
+            pool.close()
+
+    def test_execute_in_shell_pool(self):
+        use_shell_pool(1)
+        try:
+            cmd = Command("pwd\ncd c\npwd")
+            path = self.test_project_dir.resolve()
+            self.assertEqual("%s\n%s/c\n" % (path, path),
+                             cmd.execute_from(self.test_project_dir))
+            with self.assertRaises(subprocess.CalledProcessError):
+                cmd.execute_from(Path('.'))
+        finally:
+            use_shell_pool(0)
+
+    def test_cmd_run(self):
+        result = cmd_run(["echo out", "echo err >&2", "exit 3"])
+        self.assertEqual((3, b"out\n", b"err\n"),
+                         (result.returncode, result.stdout, result.stderr))
+        self.assertEqual(-9, cmd_run(["kill -9 $$"]).returncode)
+        self.assertGreaterEqual(result.cpu_time, 0)
+        self.assertGreater(result.max_rss, 0)
+        output = NamedTemporaryFile()
+        result = cmd_run(["echo streamed"], output.name)
+        self.assertIsNone(result.stdout)
+        self.assertEqual(b"streamed\n", output.read())
+
+    def test_cmd_run_cancel(self):
+        cancel_event = Event()
+        Timer(0.2, cancel_event.set).start()
+        start = time.monotonic()
+        result = cmd_run(["sleep 10 | cat"], cancel_event=cancel_event)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(result.cancelled)
+        self.assertTrue(result.returncode)
+
+    @mock.patch("rpg.command.KILL_TIMEOUT", 0.2)
+    def test_cmd_run_cancel_ignored_sigterm(self):
+        cancel_event = Event()
+        cancel_event.set()
+        start = time.monotonic()
+        result = cmd_run(["trap '' TERM", "sleep 10"],
+                         cancel_event=cancel_event)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(result.cancelled)
+        self.assertEqual(-9, result.returncode)
+
+    def test_shell_pool_malformed_commands(self):
+        pool = ShellPool(1)
+        try:
+            result = pool.run(["echo hi # comment", "echo after"])
+            self.assertEqual((0, b"hi\n"), (result.returncode, result.stdout))
+            result = pool.run(["echo 'unbalanced"])
+            self.assertTrue(result.returncode)
+            self.assertTrue(result.stderr)
+            result = pool.run(["if then fi"])
+            self.assertTrue(result.returncode)
+            # worker survives failed commands
+            self.assertEqual(b"ok\n", pool.run(["echo ok"]).stdout)
+        finally:
+            pool.close()
@@ -0,0 +1,43 @@
+from support import RpgTestCase
+from rpg.file_classifier import FileClassifier, UNIFIED_DIFF
+from rpg.plugins.misc.find_patch import FindPatchPlugin
+from rpg.spec import Spec
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree, copy2
+from unittest import mock
+
+
+class FileClassifierTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_classifier_"))
+        (self.tmp_dir / "debian" / "patches").mkdir(parents=True)
+        copy2(str(self.test_project_dir / "patch" / "0.patch"),
+              str(self.tmp_dir / "debian" / "patches" / "fix.diff"))
+        with open(str(self.tmp_dir / "debian" / "patches" / "series"),
+                  "w") as series:
+            series.write("fix.diff\n")
+        copy2(str(self.test_project_dir / "c" / "sourcecode.c"),
+              str(self.tmp_dir))
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_describe(self):
+        classifier = FileClassifier()
+        patch = self.tmp_dir / "debian" / "patches" / "fix.diff"
+        descriptions = classifier.describe(
+            [patch, self.tmp_dir / "debian", self.tmp_dir / "missing"])
+        self.assertEqual(UNIFIED_DIFF, descriptions[patch])
+        self.assertEqual("directory", descriptions[self.tmp_dir / "debian"])
+        self.assertEqual("unreadable", descriptions[self.tmp_dir / "missing"])
+        with mock.patch("rpg.file_classifier._is_unified_diff") as sniffer:
+            self.assertEqual([patch], FileClassifier().is_patch([patch]))
+            self.assertFalse(sniffer.called)
+
+    def test_find_patch_recursive(self):
+        spec = Spec()
+        FindPatchPlugin().extracted(self.tmp_dir, spec, None)
+        self.assertEqual([str(self.tmp_dir / "debian" / "patches" /
+                              "fix.diff")], spec.Patch)
@@ -0,0 +1,57 @@
+from support import RpgTestCase
+from rpg.file_index import FileIndex
+from rpg.plugin_engine import PluginEngine
+from rpg.spec import Spec
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+import os
+
+
+class FileIndexTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(os.path.realpath(mkdtemp(prefix="rpg_test_idx_")))
+        (self.tmp_dir / "usr" / "lib").mkdir(parents=True)
+        (self.tmp_dir / "usr" / "lib" / "libfoo.so.1").touch()
+        (self.tmp_dir / "usr" / "lib" / "libfoo.so").symlink_to("libfoo.so.1")
+        (self.tmp_dir / "usr" / "lib" / "libbar.so").symlink_to("/missing")
+        (self.tmp_dir / "foo.mo").touch()
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_walk(self):
+        index = FileIndex(self.tmp_dir)
+        self.assertEqual(["foo.mo", "usr", "usr/lib", "usr/lib/libbar.so",
+                          "usr/lib/libfoo.so", "usr/lib/libfoo.so.1"],
+                         [entry.relpath for entry in index.entries])
+        self.assertEqual(["foo.mo", "usr/lib/libfoo.so",
+                          "usr/lib/libfoo.so.1"],
+                         [entry.relpath for entry in index.files()])
+        self.assertEqual(self.tmp_dir / "foo.mo", index.files()[0].path)
+
+    def test_glob(self):
+        index = FileIndex(self.tmp_dir)
+        self.assertEqual(["libbar.so", "libfoo.so", "libfoo.so.1"],
+                         [entry.name for entry in index.glob("**/lib*.so*")])
+        self.assertEqual(["foo.mo"],
+                         [entry.relpath for entry in index.glob("**/*.mo")])
+        self.assertEqual(["usr/lib"],
+                         [entry.relpath for entry in index.glob("usr/*")])
+
+    def test_shared(self):
+        index = FileIndex.of(self.tmp_dir)
+        self.assertIs(index, FileIndex.of(str(self.tmp_dir) + "/"))
+        (self.tmp_dir / "new").touch()
+        self.assertIs(index, FileIndex.of(self.tmp_dir))
+        refreshed = FileIndex.of(self.tmp_dir, refresh=True)
+        self.assertIsNot(index, refreshed)
+        self.assertIn("new", [entry.relpath for entry in refreshed.entries])
+
+    def test_dropped_after_phase(self):
+        PluginEngine(Spec(), None).execute_phase("extracted", self.tmp_dir)
+        self.assertNotIn(str(self.tmp_dir), FileIndex._indexes)
+        index = FileIndex.of(self.tmp_dir)
+        FileIndex.drop(self.tmp_dir)
+        self.assertIsNot(index, FileIndex.of(self.tmp_dir))
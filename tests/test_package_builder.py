@@ -0,0 +1,117 @@
+from support import RpgTestCase
+from rpg.package_builder import PackageBuilder, BuildScheduler, mock_root
+from unittest import mock
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+import asyncio
+import os
+
+
+class BuildSrpmCacheTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_srpm_"))
+        self.project = self.test_project_dir / "hello_project"
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def fake_rpmbuild(self, cmd):
+        srpm = Path(cmd[-1]).parent.parent / "SRPMS" / "hello.src.rpm"
+        srpm.touch()
+        return ("Wrote: %s\n" % srpm).encode()
+
+    @mock.patch("rpg.package_builder.check_output")
+    def test_build_srpm_cached(self, rpmbuild):
+        rpmbuild.side_effect = self.fake_rpmbuild
+        builder = PackageBuilder(self.tmp_dir / "cache")
+        for output in ("first", "second"):
+            (self.tmp_dir / output).mkdir()
+            srpm = builder.build_srpm(self.project / "hello.spec",
+                                      self.project / "hello-1.4.tar.gz",
+                                      self.tmp_dir / output)
+            self.assertEqual(self.tmp_dir / output / "hello.src.rpm", srpm)
+            self.assertTrue(srpm.exists())
+        self.assertEqual(1, rpmbuild.call_count)
+
+
+class BuildRpmTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_mock_"))
+        self.builder = PackageBuilder()
+        self.builder.mock = str(self.tmp_dir / "mock")
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def fake_mock(self, script):
+        with open(self.builder.mock, "w") as mock_file:
+            mock_file.write("#!/bin/sh\n" + script)
+        os.chmod(self.builder.mock, 0o755)
+
+    def test_build_rpm(self):
+        self.fake_mock("echo 'INFO: Results and/or logs in: /tmp/results'\n"
+                       "echo 'Finish: run'\n")
+        lines = []
+        errors = self.builder.build_rpm(
+            "hello.src.rpm", "fedora-21", "x86_64",
+            output=lambda line, state: lines.append(
+                (line, state.result_dir)))
+        self.assertIsNone(errors)
+        self.assertEqual([("INFO: Results and/or logs in: /tmp/results",
+                           "/tmp/results"),
+                          ("Finish: run", "/tmp/results")], lines)
+
+    def test_build_rpm_fail(self):
+        self.fake_mock("echo 'ERROR: Exception(hello.src.rpm)' >&2\n"
+                       "exit 1\n")
+        errors = self.builder.build_rpm("hello.src.rpm", "fedora-21",
+                                        "x86_64")
+        self.assertEqual(["ERROR: Exception(hello.src.rpm)"], errors)
+
+
+class BuildSchedulerTest(RpgTestCase):
+
+    def setUp(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def fake_build_rpm(self, srpm_path, distro, arch, result_dir, cpus,
+                             output):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        if distro == "broken":
+            return ["EXCEPTION: build failed"]
+
+    def test_mock_root(self):
+        self.assertEqual("fedora-21-x86_64",
+                         mock_root("fedora-21-x86_64", "x86_64"))
+        self.assertEqual("fedora-21-i386", mock_root("fedora-21", "i386"))
+
+    def test_run(self):
+        builder = PackageBuilder()
+        builder.build_rpm_async = mock.MagicMock(
+            side_effect=self.fake_build_rpm)
+        scheduler = BuildScheduler(builder, workers=2, max_cpus=4,
+                                   max_memory=8192)
+        targets = [("fedora-21", "x86_64"), ("broken", "x86_64"),
+                   ("fedora-21", "i386")]
+        report = scheduler.run("hello.src.rpm", targets, "/tmp/results")
+        self.assertEqual(2, self.max_running)
+        self.assertEqual(["fedora-21-x86_64", "broken-x86_64",
+                          "fedora-21-i386"],
+                         [result.target for result in report])
+        self.assertFalse(report.success)
+        self.assertEqual(["broken-x86_64"],
+                         [result.target for result in report.failed])
+        self.assertIn("EXCEPTION: build failed", str(report))
+        self.assertEqual(2, builder.build_rpm_async.call_args[0][4])
+
+    def test_memory_limit(self):
+        scheduler = BuildScheduler(PackageBuilder(), workers=4, max_cpus=4,
+                                   max_memory=4096, memory_per_build=2048)
+        self.assertEqual(2, scheduler._worker_count(range(6)))
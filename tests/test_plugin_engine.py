@@ -3,7 +3,47 @@ from rpg import plugin_engine as engine
 from tests.project.py.plugin0 import TestPlugin
 from unittest import mock
 from rpg.plugins.lang.c import CPlugin
+from rpg.plugin import Plugin
+from rpg.plugin_manifest import PluginManifest, import_plugin_file
+from rpg.plugin_registry import PluginRegistry
+from rpg.plugins.project_builder.cmake import CMakePlugin
+from rpg.plugins.project_builder.make import MakePlugin
 from rpg.spec import Spec
+from rpg.profiler import Profiler
+from rpg.command import cmd_run
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+import json
+import pickle
+import sys
+import threading
+import time
+
+
+class RequiresPlugin(Plugin):
+
+    def extracted(self, project_dir, spec, sack):
+        spec.Requires.append("requires")
+        spec.files.append(("/requires", None, None))
+
+
+class ProcessPlugin(Plugin):
+
+    executor = "process"
+
+    def extracted(self, project_dir, spec, sack):
+        spec.Requires.append("process")
+        spec.files.insert(0, ("/process", None, None))
+        spec.Name = "process"
+
+
+class ReaderPlugin(Plugin):
+
+    reads = ["Requires"]
+
+    def extracted(self, project_dir, spec, sack):
+        spec.BuildRequires = list(spec.Requires)
 
 
 class PluginEngineTest(PluginTestCase):
@@ -28,6 +68,84 @@ class PluginEngineTest(PluginTestCase):
         self.plugin_engine.load_plugins(self.plugin_dir, ["NotAPlugin"])
         self.assertEqual(len(self.plugin_engine.plugins), 1)
 
+    def test_plugin_manifest(self):
+        plugin_dir = self.test_project_dir / "py"
+        tmp_dir = Path(mkdtemp(prefix="rpg_test_manifest_"))
+        try:
+            plugin_engine = engine.PluginEngine(Spec(), self.sack)
+            plugin_engine.manifest = PluginManifest(tmp_dir / "plugins.json")
+            plugin_engine.load_plugins(plugin_dir)
+            self.assertEqual(0, len(plugin_engine.plugins))
+            self.assertTrue((tmp_dir / "plugins.json").exists())
+
+            # unchanged files are not imported again
+            manifest = PluginManifest(tmp_dir / "plugins.json")
+            with mock.patch("rpg.plugin_manifest._describe") as describe:
+                self.assertEqual(
+                    [(str((plugin_dir / "plugin0.py").resolve()),
+                      "TestPlugin", ["extracted"], 0)],
+                    manifest.scan(plugin_dir))
+                self.assertFalse(describe.called)
+
+            plugin_engine.execute_phase(engine.phases[1], plugin_dir)
+            self.assertEqual(0, len(plugin_engine.plugins))
+            plugin_engine.execute_phase(engine.phases[0], plugin_dir)
+            self.assertEqual([TestPlugin],
+                             [type(p) for p in plugin_engine.plugins])
+        finally:
+            rmtree(str(tmp_dir))
+
+    def test_plugin_module_name(self):
+        tmp_dir = Path(mkdtemp(prefix="rpg_test_module_name_")).resolve()
+        site = tmp_dir / "venv" / "site"
+        for package in ("rpg_test_pkg", "rpg_test_ns"):
+            (site / package).mkdir(parents=True)
+            (site / package / "mod.py").touch()
+        (site / "rpg_test_pkg" / "__init__.py").touch()
+        try:
+            # project with virtualenv inside of it
+            with mock.patch.object(sys, "path",
+                                   [str(tmp_dir), str(site)] + sys.path):
+                for package in ("rpg_test_pkg", "rpg_test_ns"):
+                    module = import_plugin_file(site / package / "mod.py")
+                    self.assertEqual(package + ".mod", module.__name__)
+                    del sys.modules[package + ".mod"]
+                    del sys.modules[package]
+        finally:
+            rmtree(str(tmp_dir))
+
+    def test_plugin_registry(self):
+        entry_point = mock.MagicMock(value="rpg.plugins.lang.c:CPlugin")
+        entry_point.name = "c"
+        registry = PluginRegistry()
+        with mock.patch("rpg.plugin_registry._entry_points",
+                        return_value=[entry_point]):
+            registry.discover(excludes=["FindPatchPlugin"])
+            self.assertEqual(1, len(registry.entries))
+            PluginRegistry().discover(excludes=["CPlugin"])
+        entry = pickle.loads(pickle.dumps(registry.entries[0]))
+        self.assertIs(CPlugin, entry.load())
+        self.assertIs(entry.materialize(), entry.materialize())
+        self.assertEqual([entry.location], [e.location for e in
+                                            registry.take("patched")])
+        self.assertEqual([], registry.entries)
+
+        plugin_dir = self.test_project_dir / "py"
+        entry = engine.PluginEntry("TestPlugin", str(plugin_dir /
+                                                     "plugin0.py"))
+        self.assertIs(TestPlugin, entry.load())
+
+    def test_plugin_priority(self):
+        class UrgentPlugin(Plugin):
+            priority = 10
+
+            def extracted(self, project_dir, spec, sack):
+                pass
+        plugins = [RequiresPlugin(), UrgentPlugin(), ProcessPlugin()]
+        self.assertEqual(["UrgentPlugin", "ProcessPlugin", "RequiresPlugin"],
+                         [p.__class__.__name__
+                          for p in engine._plugin_waves(plugins)[0]])
+
     def test_execute_phase(self):
         self.plugin_engine.plugins = [mock.MagicMock()]
         self.plugin_engine.execute_phase(
@@ -37,3 +155,120 @@ class PluginEngineTest(PluginTestCase):
         plugin_call = getattr(
             self.plugin_engine.plugins[0], engine.phases[0]).call_args_list
         self.assertEqual(plugin_call, expected_call)
+
+    def test_execute_phase_parallel(self):
+        plugins = {RequiresPlugin(), ProcessPlugin()}
+        serial_spec = Spec()
+        serial_engine = engine.PluginEngine(serial_spec, self.sack)
+        serial_engine.plugins = plugins
+        serial_engine.execute_phase(engine.phases[0], self.test_project_dir)
+        parallel_spec = Spec()
+        parallel_engine = engine.PluginEngine(parallel_spec, self.sack, 2)
+        parallel_engine.plugins = plugins
+        parallel_engine.execute_phase(engine.phases[0],
+                                      self.test_project_dir)
+        self.assertEqual(["process", "requires"], parallel_spec.Requires)
+        self.assertEqual("process", parallel_spec.Name)
+        self.assertEqual(serial_spec, parallel_spec)
+        self.assertEqual(serial_spec.files, parallel_spec.files)
+
+    def test_failed_plugin_changes_dropped(self):
+        class FailingPlugin(Plugin):
+            def extracted(self, project_dir, spec, sack):
+                spec.Requires.append("half")
+                raise RuntimeError("failed")
+
+        class OtherPlugin(Plugin):
+            def extracted(self, project_dir, spec, sack):
+                spec.Requires.append("other")
+        for jobs, profiler in ((1, None), (1, Profiler()), (2, None)):
+            plugin_engine = engine.PluginEngine(Spec(), self.sack, jobs)
+            plugin_engine.plugins = {FailingPlugin(), OtherPlugin()}
+            plugin_engine.profiler = profiler
+            plugin_engine.execute_phase(engine.phases[0],
+                                        self.test_project_dir)
+            self.assertEqual(["other"], plugin_engine.spec.Requires)
+
+    def test_serial_plugin_runs_alone(self):
+        running = []
+        overlaps = []
+
+        class SlowPlugin(Plugin):
+            def extracted(self, project_dir, spec, sack):
+                running.append(self)
+                time.sleep(0.1)
+                running.remove(self)
+
+        class SerialPlugin(Plugin):
+            executor = "serial"
+
+            def extracted(self, project_dir, spec, sack):
+                overlaps.extend(running)
+        plugin_engine = engine.PluginEngine(Spec(), self.sack, 2)
+        plugin_engine.plugins = {SlowPlugin(), SerialPlugin()}
+        plugin_engine.execute_phase(engine.phases[0], self.test_project_dir)
+        self.assertEqual([], overlaps)
+
+    def test_plugin_waves(self):
+        make, cmake, requires, reader = \
+            MakePlugin(), CMakePlugin(), RequiresPlugin(), ReaderPlugin()
+        requires.writes = ["Requires"]
+        waves = engine._plugin_waves([reader, cmake, requires, make])
+        self.assertEqual([[make, requires], [cmake, reader]], waves)
+
+    def test_plugin_waves_cycle(self):
+        make, cmake = MakePlugin(), CMakePlugin()
+        make.after = ["CMakePlugin"]
+        waves = engine._plugin_waves([make, cmake])
+        self.assertEqual([[cmake], [make]], waves)
+
+    def test_profiler(self):
+        cprofile_dir = Path(mkdtemp(prefix="rpg_test_profile_"))
+        try:
+            for jobs in (1, 2):
+                profiler = Profiler(cprofile_dir)
+                plugin_engine = engine.PluginEngine(Spec(), self.sack, jobs)
+                plugin_engine.plugins = {RequiresPlugin(), ProcessPlugin()}
+                plugin_engine.profiler = profiler
+                plugin_engine.execute_phase(engine.phases[0],
+                                            self.test_project_dir)
+                self.assertEqual(["process", "requires"],
+                                 plugin_engine.spec.Requires)
+                records = dict((r["name"], r) for r in
+                               json.loads(profiler.to_json()))
+                self.assertEqual(["Name", "Requires", "files"],
+                                 records["ProcessPlugin"]["fields"])
+                self.assertEqual("extracted",
+                                 records["RequiresPlugin"]["phase"])
+                self.assertGreaterEqual(records["RequiresPlugin"]["wall"], 0)
+                self.assertIn("RequiresPlugin", profiler.table())
+            self.assertTrue((cprofile_dir /
+                             "extracted-ProcessPlugin.prof").exists())
+            # CPU time of child processes is counted
+            profiler = Profiler()
+            with profiler.step("busy_child"):
+                cmd_run(["i=0; while [ $i -lt 100000 ]; do i=$((i+1)); done"])
+            self.assertGreater(profiler.records[0]["cpu"], 0.01)
+        finally:
+            rmtree(str(cprofile_dir))
+
+    def test_cancel_phase(self):
+        cancel_event = threading.Event()
+
+        class CancellingPlugin(Plugin):
+            before = ["RequiresPlugin"]
+
+            def extracted(self, project_dir, spec, sack):
+                spec.Requires.append("cancelling")
+                cancel_event.set()
+
+        spec = Spec()
+        spec.Requires = ["original"]
+        plugin_engine = engine.PluginEngine(spec, self.sack)
+        plugin_engine.plugins = {CancellingPlugin(), RequiresPlugin()}
+        plugin_engine.cancel_event = cancel_event
+        with self.assertRaises(engine.Cancelled):
+            plugin_engine.execute_phase(engine.phases[0],
+                                        self.test_project_dir)
+        self.assertEqual(["original"], spec.Requires)
+        self.assertEqual([], spec.files)
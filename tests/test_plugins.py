@@ -1,13 +1,18 @@
 from support import PluginTestCase
-from rpg.plugins.lang.python import PythonPlugin
-from rpg.plugins.misc.find_patch import FindPatchPlugin, _is_patch
+from rpg.plugins.lang.python import PythonPlugin, _is_stdlib
+from rpg.plugins.misc.find_patch import FindPatchPlugin
 from rpg.plugins.misc.find_file import FindFilePlugin
 from rpg.plugins.misc.find_translation import FindTranslationPlugin
 from rpg.plugins.misc.find_library import FindLibraryPlugin
-from rpg.utils import get_architecture
 import sys
-from rpg.plugins.lang.c import CPlugin
+import os
+from rpg.path_resolver import include_dir_fallback
+from rpg.plugins.lang.c import CPlugin, IncludeScanner, parse_includes
+from tempfile import mkdtemp
+from pathlib import Path
+from shutil import copy, rmtree
 from rpg.spec import Spec
+from unittest import mock
 
 
 class FindPatchPluginTest(PluginTestCase):
@@ -15,11 +20,15 @@ class FindPatchPluginTest(PluginTestCase):
     def setUp(self):
         self.spec = Spec()
 
-    def test_is_patch(self):
-        patch = self.test_project_dir / "patch" / "0.patch"
-        not_patch = self.test_project_dir / "c" / "sourcecode.c"
-        self.assertTrue(_is_patch(patch))
-        self.assertFalse(_is_patch(not_patch))
+    def test_find_patch_skips_other_files(self):
+        tmp_dir = mkdtemp(prefix="rpg_test_find_patch_")
+        try:
+            copy(str(self.test_project_dir / "patch" / "0.patch"), tmp_dir)
+            copy(str(self.test_project_dir / "c" / "sourcecode.c"), tmp_dir)
+            FindPatchPlugin().extracted(Path(tmp_dir), self.spec, self.sack)
+        finally:
+            rmtree(tmp_dir)
+        self.assertEqual([tmp_dir + "/0.patch"], self.spec.Patch)
 
     def test_find_patch(self):
         plugin = FindPatchPlugin()
@@ -68,30 +77,72 @@ class FindPatchPluginTest(PluginTestCase):
         self.assertEqual(str(self.spec.postun), lib)
 
     def test_python_find_requires(self):
-        # FIXME when ORed files considered
         plugin = PythonPlugin()
         plugin.patched(self.test_project_dir / "py" / "requires",
                        self.spec, self.sack)
-        version = sys.version_info
-        arch = get_architecture()
-        if arch == 32:
-            arch = ""
-        imports = [("/usr/lib{0}/python{1}.{2}/" +
-                    "lib-dynload/math.cpython-{1}{2}m.so")
-                   .format(arch, version.major, version.minor),
-                   str(self.test_project_dir / "py" /
-                       "requires" / "sourcecode2.py")]
-        self.spec.Requires.sort()
-        imports.sort()
-        self.assertEqual(self.spec.Requires, imports)
+        # only standard library is imported
+        self.assertEqual(self.spec.Requires, [])
+
+    def test_python_stdlib_without_module_names(self):
+        # sys.stdlib_module_names is missing before python 3.10
+        old_sys = mock.Mock(builtin_module_names=sys.builtin_module_names,
+                            spec=["builtin_module_names"])
+        with mock.patch("rpg.plugins.lang.python.sys", old_sys):
+            self.assertEqual([True, True, True, False],
+                             [_is_stdlib(module) for module in
+                              ("os", "json", "xml", "pytest")])
+
+    def test_python_third_party_requires(self):
+        tmp_dir = mkdtemp(prefix="rpg_test_py_")
+        try:
+            os.makedirs(tmp_dir + "/pkg")
+            with open(tmp_dir + "/pkg/__init__.py", "w") as source:
+                source.write("import os.path\nfrom . import mod\n")
+            with open(tmp_dir + "/main.py", "w") as source:
+                source.write("import pkg, pytest\n"
+                             "def f():\n    from Unknown_Mod import x\n")
+            with open(tmp_dir + "/py2.py", "w") as source:
+                source.write("print 'python 2'\n")
+            PythonPlugin().patched(tmp_dir, self.spec, self.sack)
+            self.assertEqual(["python3dist(pytest)",
+                              "python3dist(unknown-mod)"],
+                             sorted(self.spec.Requires))
+        finally:
+            rmtree(tmp_dir)
+
+    def test_c_include_scanner(self):
+        tmp_dir = os.path.realpath(mkdtemp(prefix="rpg_test_c_"))
+        try:
+            sources = {
+                "main.c": '#include "lib.h"\n/* #include <a.h> */\n'
+                          '#if 0\n#include <b.h>\n#else\n'
+                          '#include <sys.h>\n#endif\n',
+                "lib.h": '#include <sys.h>\n#include "main.c"\n',
+                "system/sys.h": '#  include <other/sys2.h>\n',
+                "system/other/sys2.h": ''}
+            for name, content in sources.items():
+                file_path = tmp_dir + "/" + name
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, "w") as source:
+                    source.write(content)
+            self.assertEqual([("lib.h", True), ("sys.h", False)],
+                             parse_includes(tmp_dir + "/main.c"))
+            scanner = IncludeScanner([tmp_dir + "/system"])
+            self.assertEqual({tmp_dir + "/lib.h", tmp_dir + "/main.c",
+                              tmp_dir + "/system/sys.h",
+                              tmp_dir + "/system/other/sys2.h"},
+                             scanner.scan([tmp_dir + "/main.c"]))
+        finally:
+            rmtree(tmp_dir)
 
     def test_c(self):
         c_plug = CPlugin()
         c_plug.patched(self.test_project_dir, self.spec, self.sack)
         expected = ['/usr/include', '/usr/include/bits',
                     '/usr/include/gnu', '/usr/include/sys']
-        expected.sort()
-        self.spec.Requires.sort()
-        self.spec.BuildRequires.sort()
-        self.assertEqual(self.spec.Requires, expected)
-        self.assertEqual(self.spec.BuildRequires, expected)
+        # header files are emitted, unresolved ones are required by
+        # directory later
+        self.assertEqual(self.spec.Requires, self.spec.BuildRequires)
+        self.assertEqual(sorted(set(include_dir_fallback(header)
+                                    for header in self.spec.Requires)),
+                         expected)
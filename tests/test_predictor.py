@@ -0,0 +1,49 @@
+from support import RpgTestCase
+from rpg.predictor import Predictor
+from rpg import Base
+from unittest import mock
+
+
+def package(name, license, provides):
+    pkg = mock.MagicMock()
+    pkg.name = name
+    pkg.license = license
+    pkg.provides = provides
+    return pkg
+
+
+class PredictorTest(RpgTestCase):
+
+    def setUp(self):
+        self.predictor = Predictor(
+            ["libfoo", "libc", "libcurl", "libc.so.6", "python3"],
+            {"libc.so.6": 10, "libcurl": 3})
+
+    def test_complete(self):
+        self.assertEqual(["libc.so.6", "libcurl", "libc", "libfoo"],
+                         self.predictor.complete("lib"))
+        self.assertEqual(["libc.so.6", "libcurl"],
+                         self.predictor.complete("li", limit=2))
+        self.assertEqual([], self.predictor.complete("perl"))
+
+    def test_exact_match_first(self):
+        self.assertEqual(["libc", "libc.so.6"],
+                         self.predictor.complete("libc", limit=2))
+        self.assertEqual(["python3"], self.predictor.complete("python3"))
+
+    def test_base_guess(self):
+        base = Base()
+        sack = mock.MagicMock()
+        sack.query.return_value = [
+            package("python3", "Python", ["python3", "python(abi) = 3.4"]),
+            package("python3-libs", "Python", ["python3-libs"]),
+            package("glibc", "LGPLv2+ and GPLv2+", ["glibc", "libc.so.6"])]
+        base.sack = sack
+        self.assertEqual(["Python", "LGPLv2+ and GPLv2+"],
+                         base.guess_license(limit=5))
+        self.assertEqual(["glibc", "libc.so.6", "python(abi) = 3.4",
+                          "python3", "python3-libs"],
+                         base.guess_provide())
+        self.assertEqual(["python3", "python3-libs"],
+                         base.guess_dependency("python3"))
+        self.assertEqual(1, sack.query.call_count)
@@ -0,0 +1,81 @@
+from support import RpgTestCase
+from rpg.sack_index import SackIndex, LazySack
+from rpg.path_resolver import PathResolver, replace_paths
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import mock
+import threading
+
+
+def package(name, license, provides, files):
+    pkg = mock.MagicMock()
+    pkg.name = name
+    pkg.license = license
+    pkg.provides = provides
+    pkg.files = files
+    return pkg
+
+
+class SackIndexTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_sack_"))
+        self.sack = mock.MagicMock()
+        self.sack.query.return_value = [
+            package("python3", "Python", ["python3", "python(abi) = 3.4"],
+                    ["/usr/bin/python3"]),
+            package("glibc-headers", "LGPLv2+", ["glibc-headers"],
+                    ["/usr/include", "/usr/include/stdio.h"])]
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_build_open(self):
+        index = SackIndex(self.tmp_dir / "sack.sqlite")
+        self.assertFalse(index.open("checksum"))
+        index.build(self.sack, "checksum")
+        index = SackIndex(self.tmp_dir / "sack.sqlite")
+        self.assertFalse(index.open("other checksum"))
+        self.assertTrue(index.open("checksum"))
+        self.assertEqual(["glibc-headers", "python3"], index.names())
+        self.assertEqual(["glibc-headers", "python(abi) = 3.4", "python3"],
+                         index.provides())
+        self.assertEqual(["LGPLv2+", "Python"], index.licenses())
+
+    def test_owners(self):
+        index = SackIndex(self.tmp_dir / "sack.sqlite")
+        index.build(self.sack, "checksum")
+        self.assertEqual({"/usr/include": "glibc-headers",
+                          "/usr/bin/python3": "python3"},
+                         index.owners(["/usr/include", "/usr/bin/python3",
+                                       "/usr/include", "/nonexistent"]))
+
+    def test_path_resolver(self):
+        index = SackIndex(self.tmp_dir / "sack.sqlite")
+        index.build(self.sack, "checksum")
+        cache_path = self.tmp_dir / "path_cache"
+        resolver = PathResolver(index, path=cache_path)
+        owners = resolver.resolve(["/usr/include", "/usr/lib/foo"])
+        self.assertEqual({"/usr/include": "glibc-headers"}, owners)
+        self.assertEqual(["glibc-headers", "/usr/lib/foo", "make"],
+                         replace_paths(["/usr/include", "/usr/lib/foo",
+                                        "glibc-headers", "make"], owners))
+        resolver.save()
+        with mock.patch.object(index, "owners") as index_owners:
+            resolver = PathResolver(index, path=cache_path)
+            self.assertEqual(owners, resolver.resolve(["/usr/include",
+                                                       "/usr/lib/foo"]))
+            self.assertFalse(index_owners.called)
+
+    def test_lazy_sack(self):
+        loaded = threading.Event()
+
+        def load():
+            loaded.wait()
+            return self.sack
+        lazy_sack = LazySack(load)
+        self.assertFalse(lazy_sack.loaded)
+        loaded.set()
+        self.assertEqual(2, len(lazy_sack.query()))
+        self.assertTrue(lazy_sack.loaded)
@@ -7,6 +7,10 @@ from rpg.source_loader import SourceLoader
 from support import RpgTestCase
 from shutil import rmtree
 from unittest import expectedFailure
+from zipfile import ZipFile
+import io
+import os
+import tarfile
 
 
 class SourceLoaderTest(RpgTestCase):
@@ -91,6 +95,46 @@ class SourceLoaderTest(RpgTestCase):
             self.md5TarXz(str(self._tar_xz)),
             self.md5Dir(str(self._tar_extracted)))
 
+    def test_zip_extract(self):
+        archive = self._tar_temp + "sample.zip"
+        with ZipFile(archive, "w") as zip_file:
+            for name in ("Makefile", "c/sourcecode.c", "patch/0.patch"):
+                zip_file.write(str(self.test_project_dir / name), name)
+        progress = []
+        self._source_loader = SourceLoader(
+            lambda done, total, speed: progress.append((done, total)))
+        self._source_loader.load_sources(archive, self._tar_extracted)
+        self.assertExistInDir(["Makefile", "c/sourcecode.c", "patch/0.patch"],
+                              self._tar_extracted)
+        self.assertEqual(progress[-1][0], progress[-1][1])
+        self.assertEqual("unzip %s -d %s" % (archive, self._tar_extracted),
+                         str(self._source_loader.prep))
+
+    def test_tar_duplicate_links(self):
+        archive = self._tar_temp + "links.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            for name in ("a", "b"):
+                info = tarfile.TarInfo(name)
+                info.size = 1
+                tar.addfile(info, io.BytesIO(name.encode()))
+            for link_type, name, target in (
+                    (tarfile.SYMTYPE, "link", "a"),
+                    (tarfile.SYMTYPE, "link", "b"),
+                    (tarfile.LNKTYPE, "hard", "a"),
+                    (tarfile.LNKTYPE, "hard", "b"),
+                    (tarfile.SYMTYPE, "b", "a")):
+                info = tarfile.TarInfo(name)
+                info.type = link_type
+                info.linkname = target
+                tar.addfile(info)
+        self._source_loader.load_sources(archive, self._tar_extracted)
+        extracted = self._tar_extracted + "/"
+        self.assertEqual("b", os.readlink(extracted + "link"))
+        self.assertEqual("a", os.readlink(extracted + "b"))
+        # file replaced by symlink is not changed
+        with open(extracted + "hard") as hard:
+            self.assertEqual("b", hard.read())
+
     def test_dir_source_loader(self):
         self._source_loader.load_sources(
             str(self.test_project_dir),
@@ -0,0 +1,93 @@
+from support import RpgTestCase
+from rpg.utils import (copy_tree, sync_tree, process_map, atomic_write,
+                       PARALLEL_THRESHOLD)
+from rpg.source_loader import SourceLoader
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import mock
+from shutil import rmtree
+import os
+
+
+class CopyTreeTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_utils_"))
+        self.source = self.tmp_dir / "source"
+        (self.source / "dir").mkdir(parents=True)
+        with open(str(self.source / "dir" / "file"), "w") as f:
+            f.write("content")
+        os.symlink("dir/file", str(self.source / "link"))
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_copy_tree(self):
+        target = self.tmp_dir / "copy"
+        self.assertEqual(["copy2"], copy_tree(self.source, target,
+                                              reflinks=False))
+        self.assertExistInDir(["dir/file", "link"], target)
+        self.assertEqual("dir/file", os.readlink(str(target / "link")))
+        self.assertNotEqual((self.source / "dir" / "file").stat().st_ino,
+                            (target / "dir" / "file").stat().st_ino)
+
+    def test_imported_dir_is_independent(self):
+        loader = SourceLoader()
+        extracted = self.tmp_dir / "extracted"
+        loader.copy_dir(str(self.source), str(extracted))
+        copied = extracted / "source" / "dir" / "file"
+        with open(str(copied), "w") as f:
+            f.write("patched")
+        os.chmod(str(copied), 0o600)
+        with open(str(self.source / "dir" / "file")) as f:
+            self.assertEqual("content", f.read())
+        self.assertNotEqual((self.source / "dir" / "file").stat().st_ino,
+                            copied.stat().st_ino)
+
+    def test_sync_tree(self):
+        target = self.tmp_dir / "sync"
+        synced = sync_tree(self.source, target)
+        self.assertEqual({"dir/file", "link"}, synced)
+        with open(str(target / "output"), "w") as f:
+            f.write("build output")
+        os.unlink(str(self.source / "link"))
+        with open(str(self.source / "dir" / "file"), "w") as f:
+            f.write("changed content")
+        synced = sync_tree(self.source, target, synced)
+        self.assertEqual({"dir/file"}, synced)
+        self.assertFalse(os.path.lexists(str(target / "link")))
+        self.assertExistInDir(["output"], target)
+        with open(str(target / "dir" / "file")) as f:
+            self.assertEqual("changed content", f.read())
+
+
+class ProcessMapTest(RpgTestCase):
+
+    def test_process_map(self):
+        items = list(range(-PARALLEL_THRESHOLD, 0))
+        expected = [abs(item) for item in items]
+        self.assertEqual(expected, process_map(abs, items))
+        with mock.patch("rpg.utils.ProcessPoolExecutor") as executor:
+            self.assertEqual(expected, process_map(abs, items, jobs=1))
+            self.assertEqual([1], process_map(abs, [-1]))
+            self.assertFalse(executor.called)
+
+
+class AtomicWriteTest(RpgTestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(mkdtemp(prefix="rpg_test_utils_"))
+
+    def tearDown(self):
+        rmtree(str(self.tmp_dir))
+
+    def test_atomic_write(self):
+        path = self.tmp_dir / "dir" / "file"
+        with atomic_write(path, "w") as f:
+            f.write("old")
+        with self.assertRaises(RuntimeError):
+            with atomic_write(path, "w") as f:
+                f.write("new")
+                raise RuntimeError()
+        self.assertEqual("old", path.read_text())
+        self.assertEqual(["file"], os.listdir(str(path.parent)))